@@ -0,0 +1,90 @@
+"""
+Synthetic midi files for the benchmarks, generated from a seed so every run renders the same notes.
+"""
+
+import os
+import random
+
+from mido import Message, MetaMessage, MidiFile, MidiTrack, bpm2tempo
+
+class Fixture():
+    """
+    Parameters of a synthetic midi file
+
+        name: name of the fixture (and its file)
+        notes: number of notes in every track
+        polyphony: number of notes sounding at once in every track
+        tempo_changes: number of tempo changes spread over the file
+        seconds: approximate length of the file at 120 bpm
+        tracks: number of tracks with notes (track 0 only has the tempo changes)
+        note_ticks: length of every note in ticks (None: notes last until the next note of their voice)
+    """
+    def __init__(self, name : str, notes : int, polyphony : int, tempo_changes : int, seconds : float, tracks : int = 2, note_ticks : int = None):
+        self.name = name
+        self.notes = notes
+        self.polyphony = polyphony
+        self.tempo_changes = tempo_changes
+        self.seconds = seconds
+        self.tracks = tracks
+        self.note_ticks = note_ticks
+
+    def generate(self, directory : str, seed : int = 0):
+        """
+        Writes the midi file to directory (unless it is already there) and returns its name
+        """
+        filename = os.path.join(directory, f"{self.name}.mid")
+        if os.path.exists(filename):
+            return filename
+
+        rng = random.Random(f"{self.name}:{seed}")
+
+        ticks_per_beat = 480
+        # 120 bpm
+        total_ticks = int(self.seconds * 2 * ticks_per_beat)
+
+        midi = MidiFile(type = 1, ticks_per_beat = ticks_per_beat)
+
+        tempo_track = MidiTrack()
+        tempo_track.append(MetaMessage("set_tempo", tempo = bpm2tempo(120), time = 0))
+        tempo_ticks = sorted(rng.randrange(1, max(total_ticks, 2)) for i in range(self.tempo_changes))
+        last_tick = 0
+        for tick in tempo_ticks:
+            tempo_track.append(MetaMessage("set_tempo", tempo = bpm2tempo(rng.uniform(100, 140)), time = tick - last_tick))
+            last_tick = tick
+        midi.tracks.append(tempo_track)
+
+        for track_number in range(self.tracks):
+            # every voice plays notes back to back, the voices overlap
+            events = list()
+            notes_per_voice = max(self.notes // self.polyphony, 1)
+            note_ticks = max(total_ticks // notes_per_voice, 1)
+            length = min(self.note_ticks or note_ticks - 1, note_ticks - 1)
+            for voice in range(self.polyphony):
+                offset = rng.randrange(note_ticks)
+                for i in range(notes_per_voice):
+                    start = offset + i * note_ticks
+                    pitch = rng.randrange(36, 96)
+                    events.append((start, 1, Message("note_on", note = pitch, velocity = rng.randrange(40, 128), channel = voice % 16)))
+                    events.append((start + length, 0, Message("note_off", note = pitch, velocity = 0, channel = voice % 16)))
+
+            events.sort(key = lambda event: (event[0], event[1]))
+
+            track = MidiTrack()
+            last_tick = 0
+            for tick, order, msg in events:
+                track.append(msg.copy(time = tick - last_tick))
+                last_tick = tick
+            midi.tracks.append(track)
+
+        os.makedirs(directory, exist_ok = True)
+        midi.save(filename)
+        return filename
+
+fixtures = [
+    Fixture("short_mono", notes = 50, polyphony = 1, tempo_changes = 0, seconds = 10),
+    Fixture("dense_poly", notes = 800, polyphony = 8, tempo_changes = 0, seconds = 20),
+    Fixture("rubato", notes = 200, polyphony = 2, tempo_changes = 400, seconds = 20),
+    Fixture("long", notes = 400, polyphony = 2, tempo_changes = 10, seconds = 120),
+    # notes shorter than the envelopes of the presets, extended to the envelope's length
+    Fixture("staccato", notes = 200, polyphony = 2, tempo_changes = 0, seconds = 10, note_ticks = 10),
+]
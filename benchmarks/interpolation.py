@@ -0,0 +1,69 @@
+"""
+Compares the wave table interpolation modes:
+    throughput: output samples per second of WaveTable.get_samples
+    thd+n: power of everything but the fundamental relative to the fundamental (dB) for a pure sine table
+
+python benchmarks/interpolation.py [--table-size N] [--frequency HZ] [--seconds S]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import music
+from music.wavetable import interpolation_kernels
+
+def throughput(mode : str, table_size : int, frequency : float, seconds : float):
+    """
+    Returns the output samples per second of get_samples with mode on a 100 harmonic saw table
+    """
+    wave_table = music.WaveTableHarmonic([1 / n for n in range(1, 101)], samples = max(table_size, 256), interpolation = mode)
+    wave_table.get_samples(frequency, samples = 1024)
+
+    samples = int(seconds * music.sample_rate)
+    repeats = 5
+
+    start = time.perf_counter()
+    for i in range(repeats):
+        wave_table.get_samples(frequency, samples = samples)
+    return samples * repeats / (time.perf_counter() - start)
+
+def thd_n(mode : str, table_size : int, frequency : float, seconds : float):
+    """
+    Returns the THD+N in dB of a sine table read with mode at (about) frequency
+    """
+    wave_table = music.WaveTableHarmonic([1.0], samples = table_size, interpolation = mode)
+
+    samples = int(seconds * music.sample_rate)
+
+    # a whole number of periods in the output puts the fundamental in one bin without a window
+    fundamental = int(round(frequency * samples / music.sample_rate))
+    output = wave_table.get_samples(fundamental * music.sample_rate / samples, samples = samples, starting_phase = 0)
+
+    spectrum = np.abs(np.fft.rfft(output)) ** 2
+
+    signal = spectrum[fundamental]
+    # summed directly, subtracting the fundamental from the total cancels to 0 when the residual is tiny
+    noise = np.sum(spectrum[1:fundamental]) + np.sum(spectrum[fundamental + 1:])
+
+    # below -300 dB is numerical noise
+    return 10 * np.log10(max(noise / signal, 1e-30))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Compare wave table interpolation modes.")
+    parser.add_argument("--table-size", type = int, default = 4096, help = "samples in the measured tables (default: 4096)")
+    parser.add_argument("--frequency", type = float, default = 1234.5, help = "frequency to play in hertz (default: 1234.5)")
+    parser.add_argument("--seconds", type = float, default = 1.0, help = "length of each measured output in seconds (default: 1)")
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':<10}{'samples/s':>16}{'thd+n (dB)':>14}")
+    for mode in interpolation_kernels:
+        print(f"{mode:<10}{throughput(mode, args.table_size, args.frequency, args.seconds):>16,.0f}{thd_n(mode, args.table_size, args.frequency, args.seconds):>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Benchmark suite for the render pipeline.
+
+Every benchmark reports seconds of wall time per second of audio it produces (lower is better),
+    taking the best of several repeats.
+
+python benchmarks/run.py [--output results.json] [--compare baseline.json] [--threshold 0.1] [--only name ...]
+
+With --compare, the results are compared with a saved run and the exit status is 1
+    if any benchmark got slower by more than the threshold (a ratio, 0.1 = 10%).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import music
+from music.music import Track
+from music.midi import Midi
+from music.presets import Blips, OceanSaw, Square
+
+from fixtures import fixtures
+
+def best_time(function, repeats : int):
+    """
+    Returns the shortest wall time of repeats calls to function
+    """
+    best = float("inf")
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_wavetable_get_samples(repeats : int):
+    results = dict()
+    seconds = 5.0
+    for mode in music.wavetable.interpolation_kernels:
+        wave_table = music.WaveTableHarmonic([1 / n for n in range(1, 1025)], interpolation = mode)
+        wave_table.get_samples(440, samples = 16)
+        results[f"wavetable.get_samples[{mode}]"] = best_time(lambda: wave_table.get_samples(440, length = seconds), repeats) / seconds
+    return results
+
+def bench_set_wave_table(repeats : int):
+    # every call misses the cache (a new wave table each repeat, every note has its own harmonics): one table per midi note, each lasting a quarter second
+    frequencies = [440 * (2 ** ((pitch - 69) / 12)) for pitch in range(24, 108)]
+    audio_seconds = len(frequencies) * 0.25
+
+    def misses():
+        wave_table = music.WaveTableHarmonic([1 / n for n in range(1, 1025)])
+        for frequency in frequencies:
+            wave_table.set_wave_table(frequency)
+
+    return {"wavetable.set_wave_table[miss]": best_time(misses, repeats) / audio_seconds}
+
+def bench_envelope_apply(repeats : int):
+    envelope = music.ADSR(20, 20, 0.8, 25)
+    lengths = list(range(12000, 24000, 100))
+    audio_seconds = sum(lengths) / music.sample_rate
+    signals = [np.ones(length) for length in lengths]
+
+    def apply():
+        for signal in signals:
+            envelope.apply(signal)
+
+    def apply_uncached():
+        music.Envelope.cached_curves.clear()
+        apply()
+
+    return {
+        "envelope.apply[miss]": best_time(apply_uncached, repeats) / audio_seconds,
+        "envelope.apply[hit]": best_time(apply, repeats) / audio_seconds,
+    }
+
+def bench_track(repeats : int):
+    rng = np.random.default_rng(0)
+    sounds = [rng.standard_normal(12000) for i in range(400)]
+    positions = rng.integers(0, 48000 * 60, len(sounds))
+    audio_seconds = 60 + 12000 / music.sample_rate
+
+    def add_sounds():
+        track = Track()
+        for sound, position in zip(sounds, positions):
+            track.add_sound(sound, int(position))
+        return track
+
+    tracks = [add_sounds() for i in range(4)]
+
+    def mix():
+        Track.mix(tracks, [1 / len(tracks)] * len(tracks)).normalize()
+
+    return {
+        "track.add_sound": best_time(add_sounds, repeats) / audio_seconds,
+        "track.mix": best_time(mix, repeats) / audio_seconds,
+    }
+
+def bench_midi_synth(repeats : int, directory : str):
+    results = dict()
+    output = os.path.join(directory, "output.wav")
+
+    for fixture in fixtures:
+        filename = fixture.generate(directory)
+
+        load_time = best_time(lambda: Midi(filename), repeats)
+
+        midi = Midi(filename)
+        length = midi.synth(output, [Blips(), OceanSaw(), Square()])
+        audio_seconds = length / music.sample_rate
+
+        results[f"midi.load[{fixture.name}]"] = load_time / audio_seconds
+        results[f"midi.synth[{fixture.name}]"] = best_time(lambda: Midi(filename).synth(output, [Blips(), OceanSaw(), Square()]), repeats) / audio_seconds
+        results[f"midi.synth_stream[{fixture.name}]"] = best_time(lambda: Midi(filename).synth(output, [Blips(), OceanSaw(), Square()], block_size = 4096), repeats) / audio_seconds
+
+        # the envelopes aren't a whole number of samples long at every sample rate
+        for sample_rate in (22050, 44100):
+            results[f"midi.synth_{sample_rate}[{fixture.name}]"] = best_time(lambda: Midi(filename).synth(output, [Blips(), OceanSaw(), Square()], sample_rate = sample_rate), repeats) / audio_seconds
+
+    return results
+
+def compare(results : dict, baseline : dict, threshold : float):
+    """
+    Prints the change of every benchmark against baseline and returns the names of the ones slower by more than threshold
+    """
+    regressions = list()
+    print(f"{'benchmark':<40}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, value in results.items():
+        if name not in baseline:
+            print(f"{name:<40}{'-':>12}{value:>12.6f}{'new':>10}")
+            continue
+        change = value / baseline[name] - 1
+        flag = "  <- slower" if change > threshold else ""
+        print(f"{name:<40}{baseline[name]:>12.6f}{value:>12.6f}{change:>+10.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+benchmarks = {
+    "wavetable": bench_wavetable_get_samples,
+    "set_wave_table": bench_set_wave_table,
+    "envelope": bench_envelope_apply,
+    "track": bench_track,
+    "midi": bench_midi_synth,
+}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Run the render pipeline benchmarks (seconds of wall time per second of audio).")
+    parser.add_argument("--output", help = "write the results to this json file")
+    parser.add_argument("--compare", help = "compare the results with this json file (from --output)")
+    parser.add_argument("--threshold", type = float, default = 0.1, help = "slowdown ratio counted as a regression (default: 0.1)")
+    parser.add_argument("--repeats", type = int, default = 3, help = "repeats of every benchmark, the best is kept (default: 3)")
+    parser.add_argument("--only", nargs = "+", choices = list(benchmarks), help = "only run these groups of benchmarks")
+    parser.add_argument("--fixtures", default = None, help = "directory for the generated midi files (default: a temporary directory)")
+    args = parser.parse_args(argv)
+
+    results = dict()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = args.fixtures or temporary
+        for name in args.only or benchmarks:
+            if name == "midi":
+                results.update(benchmarks[name](args.repeats, directory))
+            else:
+                results.update(benchmarks[name](args.repeats))
+
+    report = {
+        "unit": "seconds per audio second",
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    else:
+        json.dump(report, sys.stdout, indent = 2)
+        print()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
 
 
-from .wavetable import WaveTable,WaveTableHarmonic,cos,saw,square,ocean_saw
+from .wavetable import WaveTable,WaveTableHarmonic,Oscillator
 from .music import Note,Tempo,Vibrato
 from .envelope import Envelope,ADSR
 from .instrument import Instrument
 from .parameters import *
 from .midi import Midi
-from .utils import *
\ No newline at end of file
+from .utils import *
+
+def __getattr__(name : str):
+    # cos, saw, square and ocean_saw are built by wavetable on first access
+    if name in ("cos", "saw", "square", "ocean_saw"):
+        from . import wavetable
+        return getattr(wavetable, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
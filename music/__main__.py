@@ -0,0 +1,55 @@
+
+import argparse
+import sys
+import time
+
+from .batch import render_batch
+from .presets import Blips, OceanSaw, Square
+from .wav import WavWriter
+
+def positive_int(value : str):
+    """
+    argparse type for arguments that must be a positive integer
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: '{value}'")
+    return number
+
+def main(argv = None):
+    """
+    Command line interface for rendering midi files:
+        python -m music input.mid output.wav [input.mid output.wav ...] [--workers N] [--block-size N] [--format FORMAT] [--dither] [--sample-rate N] [--oversample N]
+
+    Tracks 0, 1 and 2 are played with the Blips, OceanSaw and Square presets.
+    """
+    parser = argparse.ArgumentParser(prog = "python -m music", description = "Render midi files to wav files.")
+    parser.add_argument("files", nargs = "+", metavar = "input.mid output.wav", help = "pairs of midi files and the wav files to write them to")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes (default: number of processors)")
+    parser.add_argument("--block-size", type = positive_int, default = None, help = "render in blocks of this many samples to bound memory use")
+    parser.add_argument("--format", default = "float64", choices = list(WavWriter.sample_formats), help = "sample format of the wav files (default: float64)")
+    parser.add_argument("--dither", action = "store_true", help = "add TPDF dither when writing int16 or int24")
+    parser.add_argument("--sample-rate", type = positive_int, default = None, help = "sample rate of the wav files in hertz (default: 48000)")
+    parser.add_argument("--oversample", type = positive_int, default = 1, help = "render at this multiple of the sample rate and downsample (default: 1)")
+    args = parser.parse_args(argv)
+
+    if len(args.files) % 2 != 0:
+        parser.error("files must be given as input.mid output.wav pairs")
+
+    jobs = list(zip(args.files[0::2], args.files[1::2]))
+
+    start = time.perf_counter()
+    results = render_batch(jobs, [Blips(), OceanSaw(), Square()], args.workers, block_size = args.block_size, sample_format = args.format, dither = args.dither, sample_rate = args.sample_rate, oversample = args.oversample)
+    wall_seconds = time.perf_counter() - start
+
+    for result in results:
+        print(f"{result.input} -> {result.output}: {result.audio_seconds:.2f} s of audio in {result.wall_seconds:.2f} s ({result.throughput:.2f}x realtime)")
+
+    audio_seconds = sum(result.audio_seconds for result in results)
+    print(f"total: {audio_seconds:.2f} s of audio in {wall_seconds:.2f} s ({audio_seconds / wall_seconds:.2f}x realtime)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,114 @@
+
+from typing import List, Tuple
+
+from concurrent.futures import ProcessPoolExecutor
+
+import time
+
+from .parameters import get_sample_rate, using_sample_rate
+from .instrument import Instrument
+from .midi import Midi
+
+class BatchResult():
+    """
+    Result of rendering one midi file in a batch
+
+        input: name of the midi file
+        output: name of the wav file
+        audio_seconds: length of the rendered audio in seconds
+        wall_seconds: time taken to read and render the file in seconds
+    """
+    def __init__(self, input : str, output : str, audio_seconds : float, wall_seconds : float):
+        self.input = input
+        self.output = output
+        self.audio_seconds = audio_seconds
+        self.wall_seconds = wall_seconds
+
+    @property
+    def throughput(self):
+        """
+        seconds of audio rendered per second of wall time
+        """
+        return self.audio_seconds / self.wall_seconds if self.wall_seconds else float("inf")
+
+def warm_instruments(instruments : List[Instrument], sample_rate : int = None):
+    """
+    Builds the tables the instruments need for every midi note ahead of rendering at sample_rate
+        (as many as each wave table's cache keeps)
+
+    Optional Arguments:
+        sample_rate: sample rate the notes will be rendered at (times the oversampling factor)
+            default: None (get_sample_rate())
+    """
+    with using_sample_rate(sample_rate or get_sample_rate()):
+        for instrument in instruments:
+            for pitch in range(128):
+                instrument.wave_table.get_padded_table(440 * (2 ** ((pitch - 69) / 12)))
+
+def render_file(input : str, output : str, instruments : List[Instrument], **kwargs):
+    """
+    Renders the midi file input to the wav file output with instruments and returns a BatchResult,
+        kwargs are passed to Midi.synth
+    """
+    start = time.perf_counter()
+    length = Midi(input).synth(output, instruments, **kwargs)
+    return BatchResult(input, output, length / (kwargs.get("sample_rate") or get_sample_rate()), time.perf_counter() - start)
+
+# instruments of a BatchRenderer worker process and the sample rates their tables were built for
+_worker_instruments = None
+_worker_sample_rates = set()
+
+def _init_worker(instruments : List[Instrument]):
+    global _worker_instruments
+    _worker_instruments = instruments
+
+def _render_worker(input : str, output : str, kwargs : dict):
+    # the tables depend on the rate the notes are rendered at, which is only known per job
+    sample_rate = (kwargs.get("sample_rate") or get_sample_rate()) * kwargs.get("oversample", 1)
+    if sample_rate not in _worker_sample_rates:
+        warm_instruments(_worker_instruments, sample_rate)
+        _worker_sample_rates.add(sample_rate)
+
+    return render_file(input, output, _worker_instruments, **kwargs)
+
+class BatchRenderer():
+    """
+    Renders midi files on a pool of worker processes that is kept between batches.
+        Every worker receives the instruments once and builds their tables before its first file at each sample rate.
+
+    Arguments:
+        instruments: instrument to play each track with (see Midi.synth)
+
+    Optional Arguments:
+        workers: number of worker processes
+            default: None (the number of processors)
+
+    Use as a context manager or call close when done.
+    """
+    def __init__(self, instruments : List[Instrument], workers : int = None):
+        self.executor = ProcessPoolExecutor(max_workers = workers, initializer = _init_worker, initargs = (instruments,))
+
+    def render(self, jobs : List[Tuple[str, str]], **kwargs):
+        """
+        Renders every (midi file, wav file) pair in jobs and returns a list of BatchResult in the same order,
+            kwargs are passed to Midi.synth
+        """
+        futures = [self.executor.submit(_render_worker, input, output, kwargs) for input, output in jobs]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def render_batch(jobs : List[Tuple[str, str]], instruments : List[Instrument], workers : int = None, **kwargs):
+    """
+    Renders every (midi file, wav file) pair in jobs on a pool of worker processes and returns a list of BatchResult
+        (see BatchRenderer), kwargs are passed to Midi.synth
+    """
+    with BatchRenderer(instruments, workers) as renderer:
+        return renderer.render(jobs, **kwargs)
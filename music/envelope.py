@@ -3,12 +3,16 @@
 
 from typing import List
 
-from .parameters import sample_rate
+from .parameters import get_sample_rate
 
 import math
 
+import numpy as np
+
 from .utils import *
 
+from . import profiling
+
 
 class EnvelopePoint():
     """
@@ -58,7 +62,7 @@ class EnvelopePoint():
         quarter sine wave (downwards curvature) defined by: sin(2*pi*x)
         (faster first)
         """
-        return math.sin(2*math.pi*x)
+        return np.sin(2*np.pi*x)
     
     @staticmethod
     def half_sin(x : float):
@@ -66,7 +70,7 @@ class EnvelopePoint():
         half sine wave defined by: (sin((x - 1/2) * pi) + 1)/2
         (slower first)
         """
-        return (math.sin(math.pi * (x - 1/2)) + 1) / 2
+        return (np.sin(np.pi * (x - 1/2)) + 1) / 2
     
     @staticmethod
     def exponential(x : float, p : float = 50):
@@ -102,6 +106,14 @@ class EnvelopePoint():
 
 
 class Envelope():
+    """
+    Envelope made of points (see EnvelopePoint).
+        Absolute lengths are in samples at the sample rate the envelope is created at (sample_rate),
+        they are scaled to keep the same duration when rendering at other rates (see parameters.using_sample_rate).
+    """
+
+    # rendered curves shared by every envelope, keyed by (envelope, length, sample rate)
+    cached_curves = CacheDict(max_bytes = 64 * 1024 * 1024, name = "envelope.cached_curves")
 
     def __init__(self, points : List[EnvelopePoint]):
 
@@ -110,10 +122,16 @@ class Envelope():
         self.ratio_points = set()
         self.absolute_points = set()
 
-        self.absolute_length = 0
+        self.sample_rate = get_sample_rate()
+
+        # total length of the absolute points at self.sample_rate
+        self.base_absolute_length = 0
         self.ratio_length = 0
 
-        self.cached_time_points = CacheDict(50)
+        self.cached_time_points = CacheDict(max_count = 50, name = "envelope.cached_time_points")
+
+        # EnvelopeStages for every sample rate
+        self.__stages = dict()
 
         for point in self.points:
             if point.length_type == "ratio":
@@ -121,19 +139,41 @@ class Envelope():
                 self.ratio_length += point.length
             elif point.length_type == "absolute":
                 self.absolute_points.add(point)
-                self.absolute_length += point.length
+                self.base_absolute_length += point.length
             else:
                 raise Exception(f"Invalid EnvelopePoint.length_type: '{point.length_type}'")
-        
 
-    def value(self, x, length = 1.0):
+    def rate_scale(self):
+        """
+        Returns the factor the absolute lengths are scaled by at the current sample rate
+        """
+        return get_sample_rate() / self.sample_rate
+
+    @property
+    def absolute_length(self):
+        """
+        Total length of the absolute points in samples at the current sample rate
+        """
+        return self.base_absolute_length * self.rate_scale()
 
-        if self.absolute_length > length:
+    def time_points(self, length : float):
+        """
+        Returns a list of (start, length) tuples for every point of the envelope stretched to length
+            (length can be up to a sample shorter than the absolute length, which isn't a whole number of samples at every
+            sample rate, the points then end less than a sample after length)
+        """
+        if math.floor(self.absolute_length) > length:
             raise Exception(f"length: {length} is less that envelope's absolute length: {self.absolute_length}")
-        
-        if length not in self.cached_time_points:
-        
-            ratio_length = length - self.absolute_length
+
+        key = (length, get_sample_rate())
+
+        point_times = self.cached_time_points.get(key)
+
+        if point_times is None:
+
+            scale = self.rate_scale()
+
+            ratio_length = max(length - self.absolute_length, 0)
 
             point_times = list()
 
@@ -141,30 +181,30 @@ class Envelope():
             time = 0
 
             for point in self.points:
-                
+
                 if point.length_type == "ratio":
                     time = ratio_length * (point.length / self.ratio_length)
                 elif point.length_type == "absolute":
-                    time = point.length
+                    time = point.length * scale
                 else:
                     raise Exception(f"Invalid EnvelopePoint.length_type: '{point.length_type}'")
-                
+
                 point_times.append((pos, time))
                 pos += time
-            
-            self.cached_time_points[length] = point_times
-        
+
+            self.cached_time_points[key] = point_times
+
+        return point_times
+
+    def value(self, x, length = 1.0):
+
         prev_start = False
         prev_point = False
         prev_length = False
 
         next_point = False
 
-        # print(len(self.cached_time_points[length]), len(self.points))
-
-
-        for (start, length), point in zip(self.cached_time_points[length], self.points):
-            # print(start, length, point)
+        for (start, length), point in zip(self.time_points(length), self.points):
             if start <= x:
                 prev_start = start
                 prev_point = point
@@ -176,15 +216,211 @@ class Envelope():
         delta_value = next_point.value - prev_point.value
 
         return  delta_value * prev_point.function((x - prev_start) / prev_length) + prev_point.value
-    
-    def apply(self, array : List[float]):
-        output = list()
 
-        for i, x in enumerate(array):
-            output.append(x * self.value(i, len(array)))
-        
+    @staticmethod
+    def __shape(function, x : np.ndarray):
+        """
+        Evaluates a shape function over an array, falling back to one call per value
+            for functions that only accept scalars (the array call failing for any reason or returning another shape)
+        """
+        try:
+            y = np.asarray(function(x), dtype=np.float64)
+            if y.shape == x.shape:
+                return y
+        except Exception:
+            pass
+        return np.frompyfunc(function, 1, 1)(x).astype(np.float64)
+
+    def curve(self, length : int):
+        """
+        Returns the envelope for length samples as a read only array (sample i has the value of self.value(i, length))
+
+        Curves are kept in Envelope.cached_curves, so the points of an envelope should not be changed after it is used
+        """
+        length = int(length)
+
+        key = (self, length, get_sample_rate())
+
+        output = Envelope.cached_curves.get(key)
+
+        if output is None:
+            output = self.__build_curve(length)
+            output.setflags(write = False)
+            Envelope.cached_curves[key] = output
+
         return output
 
+    def __build_curve(self, length : int):
+        """
+        Returns a new array with the envelope for length samples
+        """
+        point_times = self.time_points(length)
+
+        output = np.empty(length, dtype=np.float64)
+
+        for ((start, time), point), (next_start, _), next_point in zip(zip(point_times, self.points), point_times[1:], self.points[1:]):
+            # samples in [start, next_start) belong to this point's region
+            first = min(math.ceil(start), length)
+            last = min(math.ceil(next_start), length)
+
+            if last <= first:
+                continue
+
+            x = (np.arange(first, last, dtype=np.float64) - start) / time
+
+            output[first:last] = (next_point.value - point.value) * Envelope.__shape(point.function, x) + point.value
+
+        # anything past the start of the final point holds its value
+        output[min(math.ceil(point_times[-1][0]), length):] = self.points[-1].value
+
+        return output
+
+    def stages(self):
+        """
+        Returns the EnvelopeStages of the envelope for EnvelopeGenerator at the current sample rate (built once)
+        """
+        rate = get_sample_rate()
+        if rate not in self.__stages:
+            self.__stages[rate] = EnvelopeStages(self)
+        return self.__stages[rate]
+
+    def apply(self, array : List[float]):
+        """
+        Multiplies array by the envelope in place (lists are converted to a new numpy array) and returns it
+        """
+        array = np.asarray(array, dtype=np.float64)
+
+        with profiling.stage("envelope", len(array)):
+            array *= self.curve(len(array))
+
+        return array
+
+class EnvelopeStages():
+    """
+    An Envelope split at its first ratio point for EnvelopeGenerator:
+        onset: curve of the points before the ratio point (played once from the start of the note)
+        hold_value: value of the ratio point, held until the note is released (None without ratio points)
+        release: curve of the points after the ratio point (played from the note off)
+    """
+    def __init__(self, envelope : Envelope):
+        # at its absolute length the ratio points of the envelope take no time
+        curve = np.array(envelope.curve(math.ceil(envelope.absolute_length)))
+        curve.setflags(write = False)
+
+        onset_length = 0
+        self.hold_value = None
+        for point in envelope.points:
+            if point.length_type == "ratio":
+                self.hold_value = point.value
+                break
+            onset_length += point.length * envelope.rate_scale()
+
+        if self.hold_value is None:
+            # without ratio points the whole envelope is played once and note_off is ignored
+            self.onset = curve
+            self.release = curve[:0]
+        else:
+            onset_length = min(math.ceil(onset_length), len(curve))
+            self.onset = curve[:onset_length]
+            self.release = curve[onset_length:]
+
+class EnvelopeGenerator():
+    """
+    Stateful envelope for a note whose end isn't known ahead of time (eg. a voice of a realtime engine).
+        process produces the envelope block by block, note_off starts the release from the current level.
+
+    Arguments:
+        envelope: the Envelope to play
+
+    A note released release length samples before its end produces the same curve as envelope.curve(length).
+    """
+
+    onset = 0
+    hold = 1
+    release = 2
+    done = 3
+
+    __slots__ = ("stages", "stage", "position", "release_gain")
+
+    def __init__(self, envelope : Envelope):
+        self.stages = envelope.stages()
+        self.stage = EnvelopeGenerator.done
+        self.position = 0
+        self.release_gain = 1.0
+
+    @property
+    def finished(self):
+        return self.stage == EnvelopeGenerator.done
+
+    def note_on(self):
+        """
+        Starts the envelope from the beginning
+        """
+        self.stage = EnvelopeGenerator.onset
+        self.position = 0
+        self.release_gain = 1.0
+
+    def level(self):
+        """
+        Returns the current value of the envelope
+        """
+        stages = self.stages
+        if self.stage == EnvelopeGenerator.onset and self.position < len(stages.onset):
+            return float(stages.onset[self.position])
+        if self.stage in (EnvelopeGenerator.onset, EnvelopeGenerator.hold) and stages.hold_value is not None:
+            return stages.hold_value
+        if self.stage == EnvelopeGenerator.release and self.position < len(stages.release):
+            return float(stages.release[self.position]) * self.release_gain
+        return 0.0
+
+    def note_off(self):
+        """
+        Starts the release from the current level
+        """
+        stages = self.stages
+        if stages.hold_value is None or self.stage in (EnvelopeGenerator.release, EnvelopeGenerator.done):
+            return
+        level = self.level()
+        start = stages.release[0] if len(stages.release) else 0.0
+        self.release_gain = level / start if start != 0 else 0.0
+        self.stage = EnvelopeGenerator.release
+        self.position = 0
+
+    def process(self, out : np.ndarray):
+        """
+        Writes the next len(out) values of the envelope to out and advances it
+        """
+        stages = self.stages
+        filled = 0
+        frames = len(out)
+
+        while filled < frames:
+            if self.stage == EnvelopeGenerator.onset:
+                count = min(frames - filled, len(stages.onset) - self.position)
+                out[filled:filled + count] = stages.onset[self.position:self.position + count]
+                self.position += count
+                filled += count
+                if self.position >= len(stages.onset):
+                    self.stage = EnvelopeGenerator.hold if stages.hold_value is not None else EnvelopeGenerator.done
+                    self.position = 0
+
+            elif self.stage == EnvelopeGenerator.hold:
+                out[filled:] = stages.hold_value
+                filled = frames
+
+            elif self.stage == EnvelopeGenerator.release:
+                count = min(frames - filled, len(stages.release) - self.position)
+                np.multiply(stages.release[self.position:self.position + count], self.release_gain, out=out[filled:filled + count])
+                self.position += count
+                filled += count
+                if self.position >= len(stages.release):
+                    self.stage = EnvelopeGenerator.done
+                    self.position = 0
+
+            else:
+                out[filled:] = 0
+                filled = frames
+
 class ADSR(Envelope):
     """
     Creates an ADSR Envelope with the specified parameters.
@@ -224,6 +460,8 @@ class ADSR(Envelope):
             self.release_function = EnvelopePoint.exponential
 
         
+        sample_rate = get_sample_rate()
+
         self.attack = EnvelopePoint(0,attack / 1000 * sample_rate,"absolute", self.attack_function)
         self.decay = EnvelopePoint(1,decay / 1000 * sample_rate,"absolute", self.decay_function)
         self.sustain = EnvelopePoint(sustain,1.0,"ratio", EnvelopePoint.linear)
@@ -1,48 +1,140 @@
 
 import math
 
-from .music import Note, Tempo
+import numpy as np
 
-from .parameters import sample_rate
+from .music import Note, Tempo, Vibrato
 
-from .wavetable import WaveTableHarmonic
+from .parameters import get_sample_rate
+
+from .wavetable import WaveTableHarmonic, Oscillator
 
 from .envelope import ADSR
 
+from .utils import *
+
+from typing import List
+
 class Instrument():
+
+    # rendered notes, see enable_note_cache
+    note_cache = None
+
+    # frequency of the vibrato in hertz
+    vibrato_rate = 5.5
+
+    # interpolation mode to read the wave table with ("nearest", "linear" or "cubic", None uses the wave table's)
+    interpolation = None
+
     def __init__(self):
         self.wave_table = WaveTableHarmonic([1 / (n) for n in range(1,100)])
         self.envelope = ADSR(25,50,0.7,50)
+
+    def enable_note_cache(self, max_bytes : int = 64 * 1024 * 1024):
+        """
+        Keeps the samples of rendered notes in a least recently used cache of up to max_bytes,
+            so notes with the same pitches, lengths and volume are only rendered once.
+
+        The cached samples are shared and read only.
+
+        note_cache.hits, note_cache.misses and note_cache.hit_rate give the cache statistics
+        """
+        self.note_cache = CacheDict(max_bytes = max_bytes, name = "instrument.note_cache")
+
     def get_note_samples(self, note : Note):
 
-        # get the length of the note in samples
-        # sample_length = note.tempo.get_time(sum(note.length))
-        # print(sample_length)
+        lengths = list(note.length)
 
-        output_samples = list()
+        if self.note_cache is None:
+            return self.__render_note(note, lengths)
 
-        total_length = note.tempo.get_time(sum(note.length))
+        # the wave table, envelope and interpolation are part of the key so changing them never returns stale renders
+        key = (self.wave_table, self.envelope, self.interpolation, self.vibrato_rate, tuple(note.pitch), tuple(note.tempo.get_time(length) for length in lengths), note.volume, note.vibrato, note.vibrato_amplitude, get_sample_rate())
 
-        if total_length < self.envelope.absolute_length:
-            note.length[-1] += self.envelope.absolute_length - total_length
+        output_samples = self.note_cache.get(key)
 
-        for i, (length, pitch) in enumerate(zip(note.length,note.pitch)):
-            if i < len(note.length) - 1:
-                output_samples += self.wave_table.get_samples(440 * (2 ** ((pitch - 69) / 12)), samples = note.tempo.get_time(length) * 7 / 8)
+        if output_samples is None:
+            output_samples = self.__render_note(note, lengths)
+            output_samples.setflags(write = False)
+            self.note_cache[key] = output_samples
+
+        return output_samples
+
+    def __render_note(self, note : Note, lengths : List[float]):
+        """
+        Renders note with the lengths of its pitches in lengths.
+            Every note is played by its own Oscillator starting at phase 0, so the wave table is never changed
+            and notes can be rendered in any order (or in several threads at once) with the same output.
+        """
+
+        # notes shorter than the envelope are extended to fit it: the last pitch is held until the samples actually
+        # rendered (every part is rounded down to whole samples) reach the absolute length of the envelope
+        minimum = math.ceil(self.envelope.absolute_length)
+
+        options = dict() if self.interpolation is None else {"interpolation": self.interpolation}
+
+        oscillator = Oscillator(self.wave_table)
+
+        if note.vibrato != Vibrato.none:
+            output_samples = oscillator.get_samples_curve(self.__frequency_curve(note, lengths, minimum), **options)
+        else:
+            output_samples = list()
+            rendered = 0
+
+            for i, (length, pitch) in enumerate(zip(lengths,note.pitch)):
+                if i < len(lengths) - 1:
+                    output_samples.append(oscillator.get_samples(440 * (2 ** ((pitch - 69) / 12)), samples = note.tempo.get_time(length) * 7 / 8, **options))
+                    output_samples.append(oscillator.get_samples_bend(440 * (2 ** ((pitch - 69) / 12)), 440 * (2 ** ((note.pitch[i+1] - 69) / 12)), samples = note.tempo.get_time(length) / 8, **options))
+                    rendered += len(output_samples[-2]) + len(output_samples[-1])
+                else:
+                    output_samples.append(oscillator.get_samples(440 * (2 ** ((pitch - 69) / 12)), samples = max(note.tempo.get_time(length), minimum - rendered), **options))
+
+            output_samples = np.concatenate(output_samples)
 
-                # print(output_samples)
-                # return output_samples
-                
-                output_samples += self.wave_table.get_samples_bend(440 * (2 ** ((pitch - 69) / 12)), 440 * (2 ** ((note.pitch[i+1] - 69) / 12)), samples = note.tempo.get_time(length) / 8)
-            else:
-                output_samples += self.wave_table.get_samples(440 * (2 ** ((pitch - 69) / 12)), samples = note.tempo.get_time(length))
-        
         output_samples = self.envelope.apply(output_samples)
 
-        output_samples = [x * note.volume for x in output_samples]
+        output_samples *= note.volume
 
         return output_samples
 
-            
+    def __frequency_curve(self, note : Note, lengths : List[float], minimum : int = 0):
+        """
+        Returns the frequency of every sample of note: each pitch is held for 7/8 of its length and bends to the next one
+            over the last 1/8 (like the parts rendered without vibrato), then the vibrato is applied.
+            The last pitch is held until the curve is at least minimum samples long.
+        """
+        parts = list()
+        rendered = 0
+
+        for i, (length, pitch) in enumerate(zip(lengths,note.pitch)):
+            frequency = 440 * (2 ** ((pitch - 69) / 12))
+            if i < len(lengths) - 1:
+                held = int(note.tempo.get_time(length) * 7 / 8)
+                bend = int(note.tempo.get_time(length) / 8)
+                next_frequency = 440 * (2 ** ((note.pitch[i+1] - 69) / 12))
+                parts.append(np.full(held, frequency))
+                parts.append(frequency + (next_frequency - frequency) * (np.arange(bend) / bend))
+                rendered += held + bend
+            else:
+                parts.append(np.full(max(int(note.tempo.get_time(length)), minimum - rendered), frequency))
+
+        frequencies = np.concatenate(parts)
+
+        # position in the note [0, 1) of every sample
+        x = np.arange(len(frequencies)) / max(len(frequencies), 1)
+
+        if note.vibrato == Vibrato.full:
+            depth = note.vibrato_amplitude
+        elif note.vibrato == Vibrato.linear:
+            depth = note.vibrato_amplitude * x
+        elif note.vibrato == Vibrato.exp:
+            depth = note.vibrato_amplitude * (50 ** x - 1) / 49
+        else:
+            raise Exception(f"Invalid Note.vibrato: '{note.vibrato}'")
+
+        # vibrato_amplitude is in cents
+        cents = depth * np.sin(np.arange(len(frequencies)) * (2 * math.pi * self.vibrato_rate / get_sample_rate()))
 
+        frequencies *= np.exp2(cents / 1200)
 
+        return frequencies
@@ -1,14 +1,22 @@
 
-from .parameters import sample_rate
+from .parameters import get_sample_rate, using_sample_rate
 from .instrument import Instrument
-import scipy.io.wavfile as wav
 
 from mido import MidiFile, tempo2bpm, tick2second
 
 from .music import Note, Tempo, Track
+from .render import render_blocks, render_tracks, peak
+from .wav import WavWriter
+from .resample import decimate, decimate_blocks
 from .utils import *
+from . import profiling
 import numpy as np
 import math
+import bisect
+import collections
+import heapq
+
+from typing import List
 
 class MidiTempo(Tempo):
     """
@@ -17,10 +25,15 @@ class MidiTempo(Tempo):
     Arguments:
         tempo: midi tempo in mico-seconds per beat
         tpb: midi ticks per beat
+
+    beat_samples is fixed at the sample rate the tempo is created at
     """
+
+    beat_samples = None
+
     def __init__(self, start_tick : int, start_sample : float, tempo : float, tpb : float):
         self.bpm = tempo2bpm(tempo)
-        self.beat_samples = sample_rate / 1000000 * tempo / tpb
+        self.beat_samples = get_sample_rate() / 1000000 * tempo / tpb
         self.start_tick = start_tick
         self.start_sample = start_sample
 
@@ -32,78 +45,322 @@ class SampleTempo(Tempo):
         tempo: midi tempo in mico-seconds per beat
         tpb: midi ticks per beat
     """
+
+    beat_samples = 1
+
     def __init__(self):
-        self.bpm = sample_rate * 60
-        self.beat_samples = 1
+        pass
+
+    @property
+    def bpm(self):
+        return get_sample_rate() * 60
+
+class TempoMap():
+    """
+    Array backed index of the tempo changes of a midi file for tick to sample conversion.
+
+    Arguments:
+        tempos: list of MidiTempo ordered by start_tick
+    """
+    def __init__(self, tempos : List[MidiTempo]):
+        self.start_ticks = np.array([tempo.start_tick for tempo in tempos], dtype=np.float64)
+        self.start_samples = np.array([tempo.start_sample for tempo in tempos], dtype=np.float64)
+        self.beat_samples = np.array([tempo.beat_samples for tempo in tempos], dtype=np.float64)
+
+        self.start_tick_list = self.start_ticks.tolist()
+
+    def tick2sample(self, tick : float):
+        """
+        Returns the sample position of tick
+        """
+        i = max(bisect.bisect_right(self.start_tick_list, tick) - 1, 0)
+
+        return self.start_samples[i] + self.beat_samples[i] * (tick - self.start_ticks[i])
+
+    def ticks2samples(self, ticks : np.ndarray):
+        """
+        Returns the sample positions of every tick in ticks
+        """
+        ticks = np.asarray(ticks, dtype=np.float64)
+
+        i = np.maximum(np.searchsorted(self.start_ticks, ticks, side = "right") - 1, 0)
+
+        return self.start_samples[i] + self.beat_samples[i] * (ticks - self.start_ticks[i])
+
+class TrackNotes():
+    """
+    The Note objects of one track of a midi file, made from its rows of Midi.notes one at a time as it is iterated.
+
+    Arguments:
+        rows: rows of Midi.notes of the track (see Midi.track_rows)
+        scale: ratio of the sample rate to render at to Midi.sample_rate
+    """
+
+    def __init__(self, rows : np.ndarray, scale : float = 1.0):
+        self.rows = rows
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        for row in self.rows:
+            yield Midi.make_note(row.item(), self.scale)
 
 class Midi():
     """
     Creates an interface for reading and synthesizing midi files.
 
     filename: name of the midi file to open
+
+    The notes are stored in notes, a structured numpy array with one row per note (see Midi.note_dtype).
+        The Note objects are only made while the notes are rendered (see TrackNotes), they aren't kept on the Midi.
+
+    While profiling is enabled (see music.profiling) synth keeps its report in profile_report.
     """
 
     sample_tempo = SampleTempo()
 
+    # samples converted at once when synth writes a track rendered in memory
+    write_block_size = 1 << 16
+
+    # layout of the rows of Midi.notes
+    note_dtype = np.dtype([
+        ("start", np.float64),      # start sample
+        ("duration", np.float64),   # length in samples
+        ("pitch", np.int16),        # midi note number
+        ("velocity", np.int16),     # midi velocity [0, 127]
+        ("channel", np.int16),
+        ("track", np.int32),
+    ])
+
     def __init__(self, filename : str):
-        self.midifile = MidiFile(filename)
-        
-
-        self.tempos = list()
-
-        for msg in self.midifile.tracks[0]:
-            if msg.type == "set_tempo":
-                if msg.time == 0:
-                    self.tempos.append(MidiTempo(0, 0, msg.tempo, self.midifile.ticks_per_beat))
-                else:
-                    self.tempos.append(MidiTempo(self.tempos[-1].start_tick + msg.time, self.tempos[-1].start_sample + self.tempos[-1].get_time(msg.time) , msg.tempo, self.midifile.ticks_per_beat))
-                # print(msg.time)
-                # print(self.tempos[-1].start_tick)
-                # print(self.tempos[-1].start_sample)
-        
-
-        for i, track in enumerate(self.midifile.tracks):
-            time = 0
+        with profiling.stage("parse"):
+            self.midifile = MidiFile(filename)
+
+            # rate of the sample positions in notes
+            self.sample_rate = get_sample_rate()
+
+            tpb = self.midifile.ticks_per_beat
+
+            # midi files default to 120 bpm until the first tempo change (replaced by a change on tick 0)
+            self.tempos = [MidiTempo(0, 0, 500000, tpb)]
+
+            # (start tick, velocity) of the notes still sounding, oldest first, for every (track, channel, pitch)
+            open_notes = dict()
+
+            # (track, start tick, end tick, pitch, velocity, channel) of every note
+            notes = list()
+
+            tick = 0
+
+            for tick, i, msg in Midi.__merged_messages(self.midifile.tracks):
+                if msg.type == "set_tempo":
+                    if self.tempos and self.tempos[-1].start_tick == tick:
+                        # the last change on a tick replaces the others
+                        self.tempos.pop()
+                    if self.tempos:
+                        last_tempo = self.tempos[-1]
+                        self.tempos.append(MidiTempo(tick, last_tempo.start_sample + last_tempo.get_time(tick - last_tempo.start_tick), msg.tempo, tpb))
+                    else:
+                        self.tempos.append(MidiTempo(0, 0, msg.tempo, tpb))
+
+                elif msg.type == "note_on" and msg.velocity > 0:
+                    open_notes.setdefault((i, msg.channel, msg.note), collections.deque()).append((tick, msg.velocity))
+
+                elif msg.type == "note_off" or msg.type == "note_on":
+                    started = open_notes.get((i, msg.channel, msg.note))
+                    if started:
+                        start_tick, velocity = started.popleft()
+                        notes.append((i, start_tick, tick, msg.note, velocity, msg.channel))
+
+            # notes that are never released end with the file
+            for (i, channel, pitch), started in open_notes.items():
+                for start_tick, velocity in started:
+                    notes.append((i, start_tick, tick, pitch, velocity, channel))
+
+            self.tempo_map = TempoMap(self.tempos)
+
+            self.notes = np.zeros(len(notes), dtype=Midi.note_dtype)
+
+            if notes:
+                tracks, start_ticks, end_ticks, pitches, velocities, channels = zip(*notes)
+
+                self.notes["start"] = self.tempo_map.ticks2samples(start_ticks)
+                self.notes["duration"] = self.tempo_map.ticks2samples(end_ticks) - self.notes["start"]
+                self.notes["pitch"] = pitches
+                self.notes["velocity"] = velocities
+                self.notes["channel"] = channels
+                self.notes["track"] = tracks
+
+                # the notes of every track in the order they start
+                self.notes = self.notes[np.lexsort((self.notes["start"], self.notes["track"]))]
+
+        self.profile_report = None
+
+    @staticmethod
+    def __merged_messages(tracks : list):
+        """
+        Yields (absolute tick, track index, message) for the messages of every track in time order
+            (messages on the same tick are ordered by track, then by their order in the track)
+        """
+        def track_messages(i, track):
+            tick = 0
             for msg in track:
-                time += msg.time
-                msg.time = time
-
-        open_notes = dict()
-
-        self.track_notes = NoneList([len(self.midifile.tracks),0])
-
-        for i, track in enumerate(self.midifile.tracks):
-            if i is not 0:
-                for msg in track:
-                    if msg.type == "note_on":
-                        open_notes[msg.note] = msg
-                    elif msg.type == "note_off":
-                        start_sample = self.tick2sample(open_notes[msg.note].time)
-                        self.track_notes[i].append(Note(Midi.sample_tempo,start_sample,[self.tick2sample(msg.time) - start_sample],[msg.note],(open_notes[msg.note].velocity / 127) ** 2))
-    
+                tick += msg.time
+                yield tick, i, msg
+
+        return heapq.merge(*[track_messages(i, track) for i, track in enumerate(tracks)], key = lambda x: (x[0], x[1]))
+
+    @property
+    def track_notes(self):
+        """
+        List of the Note objects in every track at the current sample rate, built from notes on every use
+        """
+        scale = get_sample_rate() / self.sample_rate
+        return [list(TrackNotes(rows, scale)) for rows in self.track_rows()]
+
+    def track_rows(self):
+        """
+        Returns the rows of notes of every track (views of notes, ordered by start)
+        """
+        bounds = np.searchsorted(self.notes["track"], np.arange(len(self.midifile.tracks) + 1))
+        return [self.notes[bounds[i]:bounds[i + 1]] for i in range(len(self.midifile.tracks))]
+
+    @staticmethod
+    def make_note(row : tuple, scale : float = 1.0):
+        """
+        Returns a Note for a row of Midi.notes, with its start and duration multiplied by scale
+            (the ratio of the sample rate to render at to Midi.sample_rate)
+        """
+        start, duration, pitch, velocity, channel, track = row
+        return Note(Midi.sample_tempo,start * scale,[duration * scale],[pitch],(velocity / 127) ** 2)
+
+    @staticmethod
+    def __check_rates(sample_rate : int, oversample : int):
+        """
+        Checks the sample_rate and oversample arguments of synth before anything is rendered
+            and returns them as ints (the sample rate is get_sample_rate() when sample_rate is None)
+        """
+        if sample_rate is None:
+            sample_rate = get_sample_rate()
+
+        if int(sample_rate) != sample_rate or sample_rate < 1:
+            raise Exception(f"Sample rate must be a positive integer: '{sample_rate}'")
+
+        if int(oversample) != oversample or oversample < 1:
+            raise Exception(f"Oversampling factor must be a positive integer: '{oversample}'")
+
+        return int(sample_rate), int(oversample)
+
     def tick2sample(self,tick : float):
 
-        last_tempo = None
+        return self.tempo_map.tick2sample(tick)
+
+    def synth(self, filename : str, instruments : List[Instrument], block_size : int = None, normalize : bool = True, workers : int = None, sample_format : str = "float64", dither : bool = False, sample_rate : int = None, oversample : int = 1):
+        """
+        Synthesizes the midi file to a wav file.
+
+        Arguments:
+            filename: name of the wav file to write
+            instruments: instrument to play each track with (instrument n plays track n)
+
+        Optional Arguments:
+            block_size: render in blocks of this many samples, writing each block to the file as it is produced.
+                Memory is bounded by the block size and the notes sounding at once instead of the length of the song.
+                default: None (render every track, mix and normalize in memory)
+            normalize: with block_size, scale the output so its largest absolute sample is 1.
+                The song is rendered twice, once to find the peak and once to write it.
+                default: True
+            workers: render the tracks in a pool of this many processes (without block_size).
+                The output is identical to rendering them in this process.
+                default: None
+            sample_format: format of the samples in the wav file ("int16", "int24", "float32" or "float64", see WavWriter)
+                default: "float64"
+            dither: add TPDF dither when writing an integer sample_format
+                default: False
+            sample_rate: sample rate of the wav file in hertz
+                default: None (parameters.get_sample_rate())
+            oversample: render at oversample times sample_rate and filter and downsample to sample_rate
+                (less aliasing from the oscillators at the cost of rendering more samples)
+                default: 1
+
+        Returns the length of the output in samples
+        """
 
-        for tempo in self.tempos:
-            if tempo.start_tick > tick:
-                break
-            last_tempo = tempo
+        sample_rate, oversample = Midi.__check_rates(sample_rate, oversample)
 
-        return last_tempo.start_sample + last_tempo.get_time(tick - last_tempo.start_tick)
-    
-    def synth(self, filename : str, instruments : List[Instrument]):
+        if block_size is not None:
+            return self.synth_stream(filename, instruments, block_size, normalize, sample_format, dither, sample_rate, oversample)
 
-        output_tracks = list()
+        with using_sample_rate(sample_rate * oversample):
+            scale = get_sample_rate() / self.sample_rate
+            output_tracks = render_tracks(instruments, [TrackNotes(rows, scale) for rows in self.track_rows()], workers)
 
-        for instrument, track in zip(instruments, self.track_notes):
-            new_track = Track()
-            for note in track:
-                new_track.add_sound(instrument.get_note_samples(note), int(note.beat))
-            output_tracks.append(new_track)
-        
         mixed_track = Track.mix(output_tracks, [1 / len(output_tracks) for x in output_tracks])
-        
+
+        if oversample != 1:
+            mixed_track = Track(decimate(mixed_track.data, oversample))
+
         mixed_track.normalize()
 
-        wav.write(filename, sample_rate, np.array(mixed_track.data))
\ No newline at end of file
+        with profiling.stage("write", mixed_track.length):
+            # the length is known, so the file is written through a memory map of it
+            with WavWriter(filename, sample_rate, sample_format, dither, frames = mixed_track.length) as output:
+                data = mixed_track.data
+                for start in range(0, len(data), Midi.write_block_size):
+                    output.write(data[start:start + Midi.write_block_size])
+
+        self.profile_report = profiling.finish()
+
+        return mixed_track.length
+
+    def synth_stream(self, filename : str, instruments : List[Instrument], block_size : int = 4096, normalize : bool = True, sample_format : str = "float64", dither : bool = False, sample_rate : int = None, oversample : int = 1):
+        """
+        Synthesizes the midi file to a wav file block by block (see synth)
+
+        Returns the length of the output in samples
+        """
+
+        if block_size <= 0:
+            raise Exception(f"Block size must be a positive integer: '{block_size}'")
+
+        sample_rate, oversample = Midi.__check_rates(sample_rate, oversample)
+
+        # the notes are rendered (when the blocks are iterated) at the oversampled rate
+        with using_sample_rate(sample_rate * oversample):
+            scale = get_sample_rate() / self.sample_rate
+
+            tracks = list(zip(instruments, self.track_rows()))
+
+            def track_events(instrument, rows):
+                # the Note of a row is only made when the blocks reach it
+                for note in TrackNotes(rows, scale):
+                    yield int(note.beat), instrument, note, 1 / len(tracks)
+
+            def notes():
+                # the rows of every track are ordered by start, merging them orders all the notes by start
+                return heapq.merge(*[track_events(instrument, rows) for instrument, rows in tracks], key = lambda x: x[0])
+
+            def blocks():
+                if oversample == 1:
+                    return render_blocks(notes(), block_size)
+                return decimate_blocks(render_blocks(notes(), block_size * oversample), oversample)
+
+            gain = 1.0
+
+            if normalize:
+                max_amp = peak(blocks())
+
+                if max_amp != 0:
+                    gain = 1 / max_amp
+
+            with WavWriter(filename, sample_rate, sample_format, dither) as output:
+                for block in blocks():
+                    with profiling.stage("write", len(block)):
+                        block *= gain
+                        output.write(block)
+
+        self.profile_report = profiling.finish()
+
+        return output.frames
@@ -4,12 +4,16 @@
 
 from typing import List
 
-from .parameters import sample_rate
+from .parameters import get_sample_rate
 
 from .utils import *
 
+from . import profiling
+
 from mido import MidiFile
 
+import numpy as np
+
 class Vibrato():
     none = 0
     full = 1
@@ -19,7 +23,12 @@ class Vibrato():
 class Tempo():
     def __init__(self, bpm : float):
         self.bpm = bpm
-        self.beat_samples = sample_rate / (bpm / 60.0 )
+    @property
+    def beat_samples(self):
+        """
+        Length of a beat in samples at the current sample rate
+        """
+        return get_sample_rate() / (self.bpm / 60.0 )
     def get_time(self, beat : float):
         return self.beat_samples * beat
     
@@ -54,24 +63,65 @@ class Note():
         self.volume = volume
 
 class Track():
-    def __init__(self, data = list()):
-        self.data = data
+    """
+    Buffer of samples that sounds can be added to at any position
+
+    Optional Arguments:
+        data: initial samples (copied)
+        dtype: numpy dtype of the samples (default: np.float64)
+
+    The samples are stored in a numpy array that doubles in capacity when it needs to grow,
+        data is a view of the used part of it
+    """
+    def __init__(self, data = None, dtype = np.float64):
+        self.buffer = np.array(data if data is not None else [], dtype=dtype)
+        self.length = len(self.buffer)
+
+    @property
+    def data(self):
+        return self.buffer[:self.length]
+
+    @data.setter
+    def data(self, data):
+        self.buffer = np.array(data, dtype=self.buffer.dtype)
+        self.length = len(self.buffer)
+
+    def reserve(self, length : int):
+        """
+        Makes sure the buffer can hold length samples without reallocating
+        """
+        if length > len(self.buffer):
+            buffer = np.zeros(max(length, 2 * len(self.buffer)), dtype=self.buffer.dtype)
+            buffer[:self.length] = self.data
+            self.buffer = buffer
+
     def add_sound(self, sound : List[float], pos : int):
-        if pos + len(sound) > len(self.data):
-            for i in range(pos + len(sound) - len(self.data)):
-                self.data.append(0.0)
-        for i, sample in enumerate(sound):
-            self.data[pos + i] += sample
+        with profiling.stage("add_sound", len(sound)):
+            end = pos + len(sound)
+            if end > self.length:
+                self.reserve(end)
+                self.length = end
+            self.buffer[pos:end] += sound
 
     @staticmethod
     def mix(tracks : list, volumes : List[float]):
-        new_track_data = ZeroList([max([len(y.data) for y in tracks])])
-        for track, volume in zip(tracks, volumes):
-            for i, sample in enumerate(track.data):
-                new_track_data[i] += sample * volume
-        return Track(new_track_data)
-    
+        length = max([track.length for track in tracks])
+        with profiling.stage("mix", length):
+            new_track = Track(dtype=np.result_type(*[track.buffer for track in tracks]))
+            new_track.reserve(length)
+            new_track.length = len(new_track.buffer)
+            for track, volume in zip(tracks, volumes):
+                new_track.buffer[:track.length] += track.data * volume
+        return new_track
+
     def normalize(self):
-        max_amp = max(self.data)
+        """
+        Scales the track so the largest absolute sample is 1
+        """
+        data = self.data
+
+        with profiling.stage("normalize", self.length):
+            max_amp = np.max(np.abs(data)) if self.length else 0
 
-        self.data = [x / max_amp for x in self.data]
+            if max_amp != 0:
+                data /= max_amp
@@ -1,2 +1,38 @@
+import os
+import contextlib
+import contextvars
 
-sample_rate = 48000
\ No newline at end of file
+__all__ = ["sample_rate", "cache_directory", "cache_version", "get_sample_rate", "using_sample_rate"]
+
+# default sample rate in hertz, see get_sample_rate
+sample_rate = 48000
+
+# sample rate of the render in progress (None: sample_rate), see using_sample_rate
+_render_sample_rate = contextvars.ContextVar("render_sample_rate", default = None)
+
+def get_sample_rate():
+    """
+    Returns the sample rate to render at: the one set by using_sample_rate, or sample_rate outside of it
+    """
+    rate = _render_sample_rate.get()
+    return sample_rate if rate is None else rate
+
+@contextlib.contextmanager
+def using_sample_rate(rate : int):
+    """
+    Renders at rate inside the with block (in this thread or task only), eg.
+
+        with using_sample_rate(22050):
+            samples = instrument.get_note_samples(note)
+    """
+    token = _render_sample_rate.set(rate)
+    try:
+        yield rate
+    finally:
+        _render_sample_rate.reset(token)
+
+# directory used to store precomputed tables between runs (set PYTHON_MUSIC_CACHE to change it)
+cache_directory = os.environ.get("PYTHON_MUSIC_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "python-music"))
+
+# bump whenever the layout or contents of cached tables change
+cache_version = 3
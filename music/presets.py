@@ -0,0 +1,26 @@
+
+from .instrument import Instrument
+
+from .envelope import ADSR
+
+from . import wavetable
+
+class Blips(Instrument):
+    def __init__(self):
+        self.wave_table = wavetable.saw
+        self.envelope = ADSR(25,25,0,0)
+
+class Square(Instrument):
+    def __init__(self):
+        self.wave_table = wavetable.square
+        self.envelope = ADSR(20,20,0.8,25)
+
+class Saw(Instrument):
+    def __init__(self):
+        self.wave_table = wavetable.saw
+        self.envelope = ADSR(20,20,0.8,25)
+
+class OceanSaw(Instrument):
+    def __init__(self):
+        self.wave_table = wavetable.ocean_saw
+        self.envelope = ADSR(20,20,0.8,25)
@@ -0,0 +1,178 @@
+"""
+Optional instrumentation of the render pipeline.
+
+Profiling is off by default and every hook is a no-op until enable is called:
+
+    from music import profiling
+    profiling.enable(callback = print)
+    Midi("song.mid").synth("song.wav", instruments)   # the report is passed to callback and kept in midi.profile_report
+
+Stages record how many times they ran, their total wall time and the number of samples they produced:
+    parse: reading the midi file (Midi.__init__)
+    table_build: building a band-limited table on a wave table cache miss
+    oscillator: sampling a wave table
+    envelope: Envelope.apply
+    add_sound: adding notes to a Track
+    mix: mixing tracks (or blocks when streaming)
+    decimate: filtering and downsampling oversampled renders
+    normalize: Track.normalize
+    write: writing the wav file
+
+Counters record cache hits and misses (eg. "wave_table.cached_tables.hits").
+"""
+
+import time
+
+from typing import Callable
+
+class StageStats():
+    """
+    Totals of one stage
+    """
+    __slots__ = ("calls", "seconds", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.samples = 0
+
+class Stage():
+    """
+    Context manager timing one run of a stage
+    """
+    __slots__ = ("stats", "samples", "start")
+
+    def __init__(self, stats : StageStats, samples : int):
+        self.stats = stats
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.stats.calls += 1
+        self.stats.seconds += time.perf_counter() - self.start
+        self.stats.samples += int(self.samples)
+
+class NullStage():
+    """
+    Context manager that does nothing, used for every stage while profiling is off
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        pass
+
+null_stage = NullStage()
+
+class Profiler():
+    """
+    Collects the stage timings and counters of the render pipeline (see enable)
+
+    Optional Arguments:
+        callback: function called with every report made by finish
+            default: None
+    """
+    def __init__(self, callback : Callable[[dict], None] = None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.stages = dict()
+        self.counters = dict()
+        self.started = time.perf_counter()
+
+    def stage(self, name : str, samples : int = 0):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return Stage(stats, samples)
+
+    def count(self, name : str, n : int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, report : dict):
+        """
+        Adds the stages and counters of a report (eg. from a worker process) to this profiler
+        """
+        for name, stage in report["stages"].items():
+            stats = self.stage(name).stats
+            stats.calls += stage["calls"]
+            stats.seconds += stage["seconds"]
+            stats.samples += stage["samples"]
+        for name, n in report["counters"].items():
+            self.count(name, n)
+
+    def report(self):
+        """
+        Returns the stages and counters recorded since the profiler was created or reset:
+            {
+                "seconds": wall time since then,
+                "stages": {name: {"calls", "seconds", "samples", "samples_per_second"}},
+                "counters": {name: count},
+            }
+        """
+        return {
+            "seconds": time.perf_counter() - self.started,
+            "stages": {name: {
+                "calls": stats.calls,
+                "seconds": stats.seconds,
+                "samples": stats.samples,
+                "samples_per_second": stats.samples / stats.seconds if stats.seconds else 0.0,
+            } for name, stats in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+# the active profiler, None while profiling is off
+profiler = None
+
+def enable(callback : Callable[[dict], None] = None):
+    """
+    Turns profiling on (starting from an empty report) and returns the Profiler
+
+    Optional Arguments:
+        callback: function called with the report at the end of every Midi.synth
+            default: None
+    """
+    global profiler
+    profiler = Profiler(callback)
+    return profiler
+
+def disable():
+    global profiler
+    profiler = None
+
+def enabled():
+    return profiler is not None
+
+def stage(name : str, samples : int = 0):
+    """
+    Returns a context manager timing a run of stage name that produces samples samples
+    """
+    if profiler is None:
+        return null_stage
+    return profiler.stage(name, samples)
+
+def count(name : str, n : int = 1):
+    if profiler is not None:
+        profiler.count(name, n)
+
+def finish():
+    """
+    Returns the report of everything recorded since the last one (None while profiling is off),
+        passing it to the profiler's callback
+    """
+    if profiler is None:
+        return None
+
+    report = profiler.report()
+    profiler.reset()
+
+    if profiler.callback is not None:
+        profiler.callback(report)
+
+    return report
@@ -0,0 +1,179 @@
+
+from typing import List, Tuple
+
+import numpy as np
+
+from .parameters import get_sample_rate, using_sample_rate
+
+from .instrument import Instrument
+
+from .envelope import Envelope, EnvelopeGenerator
+
+from .wavetable import InterpolationBuffers, interpolation_kernels
+
+class Voice():
+    """
+    State of one playing note of a VoiceEngine
+    """
+
+    __slots__ = ("pitch", "volume", "table", "phase", "step", "envelope", "age")
+
+    def __init__(self, envelope : Envelope):
+        self.pitch = None
+        self.volume = 0.0
+        self.table = None
+        self.phase = 0.0
+        self.step = 0.0
+        self.envelope = EnvelopeGenerator(envelope)
+        self.age = 0
+
+    @property
+    def active(self):
+        return not self.envelope.finished
+
+class VoiceEngine():
+    """
+    Block based engine that plays an instrument in real time with a fixed number of voices.
+
+    Arguments:
+        instrument: the instrument to play (its wave_table and envelope are used)
+
+    Optional Arguments:
+        voices: maximum number of notes that can sound at once, the oldest note is replaced when they are all used
+            default: 16
+        block_size: largest number of frames process will be asked for
+            default: 512
+        sample_rate: sample rate of the output in hertz
+            default: None (parameters.get_sample_rate())
+
+    note_on and note_off can be called between calls to process.
+        process only uses buffers allocated here, so it is safe to call from an audio callback.
+    """
+    def __init__(self, instrument : Instrument, voices : int = 16, block_size : int = 512, sample_rate : int = None):
+        self.instrument = instrument
+        self.sample_rate = sample_rate or get_sample_rate()
+        self.block_size = block_size
+        self.volume = 1.0
+
+        # the envelopes are built for the engine's rate
+        with using_sample_rate(self.sample_rate):
+            self.voices = [Voice(instrument.envelope) for i in range(voices)]
+        self.samples = instrument.wave_table.samples
+
+        self.age = 0
+
+        self.interpolation = instrument.interpolation or instrument.wave_table.interpolation
+
+        if self.interpolation not in interpolation_kernels:
+            raise Exception(f"Invalid interpolation mode: '{self.interpolation}'")
+
+        # work buffers for process
+        self.ramp = np.arange(block_size, dtype=np.float64)
+        self.position = np.empty(block_size, dtype=np.float64)
+        self.voice_buffer = np.empty(block_size, dtype=np.float64)
+        self.gain_buffer = np.empty(block_size, dtype=np.float64)
+        self.buffers = InterpolationBuffers(block_size, self.interpolation)
+
+    def note_on(self, pitch : int, velocity : int = 127):
+        """
+        Starts playing midi note pitch at velocity [0, 127] (velocity 0 is a note_off)
+        """
+        if velocity == 0:
+            self.note_off(pitch)
+            return
+
+        free = [voice for voice in self.voices if not voice.active]
+        voice = free[0] if free else min(self.voices, key = lambda voice: voice.age)
+
+        frequency = 440 * (2 ** ((pitch - 69) / 12))
+
+        self.age += 1
+
+        voice.pitch = pitch
+        voice.volume = (velocity / 127) ** 2
+        with using_sample_rate(self.sample_rate):
+            voice.table = np.asarray(self.instrument.wave_table.get_padded_table(frequency), dtype=np.float64)
+        voice.phase = 0.0
+        voice.step = self.samples * frequency / self.sample_rate
+        voice.envelope.note_on()
+        voice.age = self.age
+
+    def note_off(self, pitch : int):
+        """
+        Releases every voice playing midi note pitch
+        """
+        for voice in self.voices:
+            if voice.active and voice.pitch == pitch:
+                voice.envelope.note_off()
+
+    def all_notes_off(self):
+        for voice in self.voices:
+            voice.envelope.note_off()
+
+    def process(self, out : np.ndarray):
+        """
+        Overwrites out (a float64 array of at most block_size frames) with the next len(out) frames
+        """
+        frames = len(out)
+
+        out[:] = 0
+
+        position = self.position[:frames]
+        voice_buffer = self.voice_buffer[:frames]
+        gain_buffer = self.gain_buffer[:frames]
+
+        kernel = interpolation_kernels[self.interpolation]
+
+        for voice in self.voices:
+            if not voice.active:
+                continue
+
+            # table positions of the block
+            np.multiply(self.ramp[:frames], voice.step, out=position)
+            position += voice.phase
+            np.remainder(position, self.samples, out=position)
+
+            kernel(voice.table, position, voice_buffer, self.buffers)
+
+            voice.envelope.process(gain_buffer)
+            gain_buffer *= voice.volume * self.volume
+
+            voice_buffer *= gain_buffer
+            out += voice_buffer
+
+            voice.phase = (voice.phase + voice.step * frames) % self.samples
+
+def render_events(engine : VoiceEngine, events : List[Tuple[int, str, int, int]], frames : int):
+    """
+    Plays a recorded stream of events through engine offline and returns the output (for testing without audio hardware).
+
+    Arguments:
+        engine: the VoiceEngine to play the events with
+        events: list of (frame, kind, pitch, velocity) ordered by frame, kind is "note_on" or "note_off"
+        frames: length of the output in frames
+
+    Blocks are split at the events so they happen on their frame.
+    """
+    output = np.zeros(frames, dtype=np.float64)
+
+    events = list(events)
+    event = 0
+
+    block_start = 0
+    while block_start < frames:
+        while event < len(events) and events[event][0] <= block_start:
+            frame, kind, pitch, velocity = events[event]
+            if kind == "note_on":
+                engine.note_on(pitch, velocity)
+            elif kind == "note_off":
+                engine.note_off(pitch)
+            event += 1
+
+        block_end = min(block_start + engine.block_size, frames)
+        if event < len(events):
+            block_end = min(block_end, max(events[event][0], block_start + 1))
+
+        engine.process(output[block_start:block_end])
+        block_start = block_end
+
+    return output
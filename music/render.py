@@ -0,0 +1,193 @@
+
+import os
+import sys
+
+from typing import List, Iterable, Tuple
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from .instrument import Instrument
+from .music import Note, Track
+from . import profiling
+from .parameters import get_sample_rate, using_sample_rate
+
+def render_track(instrument : Instrument, notes : Iterable[Note]):
+    """
+    Renders notes (in order) with instrument and returns them in a new Track
+    """
+    track = Track()
+    for note in notes:
+        track.add_sound(instrument.get_note_samples(note), int(note.beat))
+    return track
+
+def _render_track_shared(instrument : Instrument, notes : Iterable[Note], profile : bool = False, sample_rate : int = None):
+    """
+    Process pool worker for render_tracks.
+        Renders the track at sample_rate and returns (block name, data, length, dtype, profiling report).
+        On POSIX the samples are handed over in a new shared memory block (data is None) and the caller is responsible
+        for unlinking it, elsewhere a block is freed with its last handle so the samples are returned in data (block name is None).
+        The report is None unless profile is set.
+    """
+    if profile:
+        profiling.enable()
+
+    try:
+        with using_sample_rate(sample_rate or get_sample_rate()):
+            track = render_track(instrument, notes)
+        report = profiling.finish()
+    finally:
+        profiling.disable()
+
+    if track.length == 0:
+        return None, None, 0, track.buffer.dtype.str, report
+
+    if os.name != "posix":
+        return None, track.data, track.length, track.buffer.dtype.str, report
+
+    if sys.version_info >= (3, 13):
+        # the caller owns the block, the resource tracker of this process mustn't unlink it when the process ends
+        block = shared_memory.SharedMemory(create = True, size = track.data.nbytes, track = False)
+    else:
+        block = shared_memory.SharedMemory(create = True, size = track.data.nbytes)
+        resource_tracker.unregister(block._name, "shared_memory")
+
+    np.ndarray(track.length, dtype=track.buffer.dtype, buffer=block.buf)[:] = track.data
+    block.close()
+
+    return block.name, None, track.length, track.buffer.dtype.str, report
+
+def render_tracks(instruments : List[Instrument], track_notes : List[Iterable[Note]], workers : int = None):
+    """
+    Renders every track with the instrument at the same index and returns a list of Tracks.
+
+    Arguments:
+        instruments: instrument to play each track with
+        track_notes: list of the notes in each track (any iterable of Notes, it has to be picklable with workers)
+
+    Optional Arguments:
+        workers: number of processes to render the tracks in
+            default: None (render the tracks one after the other in this process)
+
+    Every note is rendered on its own (see Instrument.get_note_samples),
+        so the output is the same whether the tracks are rendered in this process or in workers.
+    """
+    tracks = list(zip(instruments, track_notes))
+
+    if workers is None:
+        return [render_track(instrument, notes) for instrument, notes in tracks]
+
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        # the workers don't share this context, so the sample rate is passed along
+        futures = [executor.submit(_render_track_shared, instrument, notes, profiling.enabled(), get_sample_rate()) for instrument, notes in tracks]
+
+        output_tracks = list()
+        remaining = list(futures)
+        try:
+            while remaining:
+                name, data, length, dtype, report = remaining.pop(0).result()
+
+                if data is not None:
+                    output_tracks.append(Track(data, dtype=dtype))
+                elif name is None:
+                    output_tracks.append(Track(dtype=dtype))
+                else:
+                    block = shared_memory.SharedMemory(name = name)
+                    try:
+                        output_tracks.append(Track(np.ndarray(length, dtype=dtype, buffer=block.buf), dtype=dtype))
+                    finally:
+                        block.close()
+                        block.unlink()
+
+                if report is not None and profiling.profiler is not None:
+                    # the stages of the workers are added up (their wall times overlap)
+                    profiling.profiler.merge(report)
+        finally:
+            # after a failure the workers still running create blocks nobody reads, wait for them and unlink them
+            for future in remaining:
+                if future.cancel():
+                    continue
+                try:
+                    name = future.result()[0]
+                except Exception:
+                    continue
+                if name is not None:
+                    _unlink_block(name)
+
+    return output_tracks
+
+def _unlink_block(name : str):
+    """
+    Unlinks the shared memory block name returned by _render_track_shared
+    """
+    block = shared_memory.SharedMemory(name = name)
+    block.close()
+    block.unlink()
+
+def render_blocks(notes : Iterable[Tuple[int, Instrument, Note, float]], block_size : int = 4096):
+    """
+    Renders notes in blocks of block_size samples, only keeping the notes that sound in the current block.
+
+    Arguments:
+        notes: iterable of (start sample, instrument, note, volume) ordered by start sample
+        block_size: number of samples in each block
+
+    Yields one array per block, every block but the last has block_size samples.
+        The same buffer is reused for every block, so it has to be used (or copied) before the next one is requested.
+    """
+    if block_size <= 0:
+        raise Exception(f"Block size must be a positive integer: '{block_size}'")
+
+    notes = iter(notes)
+    pending = next(notes, None)
+
+    # (start sample, samples, volume) of every note that hasn't finished yet
+    active = list()
+
+    block = np.zeros(block_size, dtype=np.float64)
+    block_start = 0
+    end = 0
+
+    while pending is not None or active:
+        block_end = block_start + block_size
+
+        while pending is not None and pending[0] < block_end:
+            start, instrument, note, volume = pending
+            samples = instrument.get_note_samples(note)
+            active.append((start, samples, volume))
+            end = max(end, start + len(samples))
+            pending = next(notes, None)
+
+        still_active = list()
+
+        with profiling.stage("mix", block_size):
+            block[:] = 0
+
+            for start, samples, volume in active:
+                first = max(block_start - start, 0)
+                last = min(block_end - start, len(samples))
+                if last > first:
+                    block[start + first - block_start:start + last - block_start] += samples[first:last] * volume
+                if start + len(samples) > block_end:
+                    still_active.append((start, samples, volume))
+
+        active = still_active
+
+        if pending is None and not active:
+            yield block[:min(end - block_start, block_size)]
+        else:
+            yield block
+
+        block_start = block_end
+
+def peak(blocks : Iterable[np.ndarray]):
+    """
+    Returns the largest absolute sample in blocks
+    """
+    max_amp = 0.0
+    for block in blocks:
+        if len(block):
+            max_amp = max(max_amp, float(np.max(np.abs(block))))
+    return max_amp
@@ -0,0 +1,136 @@
+
+from typing import Iterable
+
+import numpy as np
+
+from . import profiling
+
+class Decimator():
+    """
+    Streaming low-pass filter and downsampler, used to bring oversampled renders back to the output rate.
+
+    Arguments:
+        factor: integer ratio of the input sample rate to the output sample rate
+
+    Optional Arguments:
+        taps: length of the filter in output samples (it has taps * factor + 1 taps)
+            default: 32
+        cutoff: edge of the passband as a fraction of the output's half sample rate
+            default: 0.9
+
+    The filter is linear phase and centred, so output sample n lines up with input sample n * factor
+        and the output has ceil(inputs / factor) samples.
+    It is applied in polyphase form: only the kept samples are computed, each as the dot product of the filter
+        with the inputs around it.
+    """
+
+    # outputs computed at once (bounds the size of the window matrix)
+    chunk_size = 4096
+
+    def __init__(self, factor : int, taps : int = 32, cutoff : float = 0.9):
+        if int(factor) != factor or factor < 1:
+            raise Exception(f"Decimation factor must be a positive integer: '{factor}'")
+
+        self.factor = int(factor)
+
+        # inputs on each side of the centre of the filter
+        self.delay = taps * self.factor // 2 if self.factor > 1 else 0
+
+        if self.factor > 1:
+            # scipy.signal takes about a second to import, so only renders that decimate load it
+            import scipy.signal
+            self.filter = scipy.signal.firwin(2 * self.delay + 1, cutoff / self.factor)[::-1].copy()
+        else:
+            self.filter = np.ones(1)
+
+        # inputs still needed by the next outputs, buffer[0] is input number start (inputs before 0 are silence)
+        self.buffer = np.zeros(self.delay)
+        self.start = -self.delay
+
+        self.inputs = 0
+        self.outputs = 0
+
+    def process(self, samples : np.ndarray):
+        """
+        Adds samples to the input and returns the outputs that can be computed from it so far
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+
+        if self.factor == 1:
+            self.inputs += len(samples)
+            self.outputs += len(samples)
+            return samples.copy()
+
+        self.buffer = np.concatenate((self.buffer, samples))
+        self.inputs += len(samples)
+
+        # output n needs inputs n * factor - delay to n * factor + delay
+        return self.__emit((self.inputs - 1 - self.delay) // self.factor + 1)
+
+    def flush(self):
+        """
+        Returns the remaining outputs, taking the input after its end as silence
+        """
+        total = -(-self.inputs // self.factor)
+
+        if self.factor == 1 or total <= self.outputs:
+            return np.empty(0, dtype=np.float64)
+
+        self.buffer = np.concatenate((self.buffer, np.zeros(self.delay + self.factor)))
+
+        return self.__emit(total)
+
+    def __emit(self, end : int):
+        """
+        Returns outputs self.outputs to end (not included) and drops the inputs no later output needs
+        """
+        count = end - self.outputs
+
+        if count <= 0:
+            return np.empty(0, dtype=np.float64)
+
+        output = np.empty(count, dtype=np.float64)
+
+        with profiling.stage("decimate", count):
+            windows = np.lib.stride_tricks.sliding_window_view(self.buffer, len(self.filter))
+
+            first = self.outputs * self.factor - self.delay - self.start
+
+            for done in range(0, count, Decimator.chunk_size):
+                chunk = min(Decimator.chunk_size, count - done)
+                start = first + done * self.factor
+                np.dot(windows[start:start + chunk * self.factor:self.factor], self.filter, out=output[done:done + chunk])
+
+            self.outputs = end
+
+            drop = self.outputs * self.factor - self.delay - self.start
+            self.buffer = self.buffer[drop:]
+            self.start += drop
+
+        return output
+
+def decimate(samples : np.ndarray, factor : int, block_size : int = 1 << 16):
+    """
+    Returns samples downsampled by factor (see Decimator), processed block_size samples at a time
+    """
+    decimator = Decimator(factor)
+
+    output = [decimator.process(samples[start:start + block_size]) for start in range(0, len(samples), block_size)]
+    output.append(decimator.flush())
+
+    return np.concatenate(output)
+
+def decimate_blocks(blocks : Iterable[np.ndarray], factor : int):
+    """
+    Yields the blocks downsampled by factor (see Decimator), the last block holds what is left in the filter
+    """
+    decimator = Decimator(factor)
+
+    for block in blocks:
+        output = decimator.process(block)
+        if len(output):
+            yield output
+
+    output = decimator.flush()
+    if len(output):
+        yield output
@@ -2,6 +2,20 @@
 
 from typing import List
 
+from collections import OrderedDict
+
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from . import parameters
+from . import profiling
+
+__all__ = ["RangeFloat", "NoneList", "ZeroList", "CacheDict", "disk_cached_array"]
 
 class RangeFloat():
     def __init__(self, start : float, stop : float, step : float):
@@ -64,16 +78,178 @@ def ZeroList(dims : List[int]):
             out.append(0)
     return out
 
-class CacheDict(dict):
-    def __init__(self, max_count : int):
+class CacheDict():
+    """
+    Thread safe least recently used cache
+
+    Optional Arguments:
+        max_count: number of values to keep
+            default: None (no limit)
+        max_bytes: total size in bytes of the values to keep (nbytes for numpy arrays, sys.getsizeof for anything else),
+            values larger than max_bytes are not stored
+            default: None (no limit)
+        name: prefix of the hit and miss counters reported to profiling (eg. "wave_table.cached_tables")
+            default: None (not reported)
+
+    The least recently used values are evicted once either limit is exceeded.
+
+    hits and misses count the lookups done with get or [] (hit_rate is hits / lookups),
+        evictions counts the values removed to stay within the limits
+    """
+    def __init__(self, max_count : int = None, max_bytes : int = None, name : str = None):
         self.max_count = max_count
-        self.dict = dict()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dict = OrderedDict()
+        self.sizes = dict()
+        self.lock = threading.RLock()
+        self.hit_counter = f"{name}.hits" if name else None
+        self.miss_counter = f"{name}.misses" if name else None
+
+    def __getstate__(self):
+        # locks can't be pickled (eg. when an instrument is sent to a worker process)
+        with self.lock:
+            state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def sizeof(value):
+        nbytes = getattr(value, "nbytes", None)
+        return nbytes if nbytes is not None else sys.getsizeof(value)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
     def __contains__(self, x):
         return x in self.dict
+
+    def __len__(self):
+        return len(self.dict)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.dict))
+
+    def keys(self):
+        with self.lock:
+            return list(self.dict.keys())
+
+    def values(self):
+        with self.lock:
+            return list(self.dict.values())
+
+    def items(self):
+        with self.lock:
+            return list(self.dict.items())
+
+    def get(self, x, default = None):
+        with self.lock:
+            hit = x in self.dict
+            if hit:
+                self.hits += 1
+                self.dict.move_to_end(x)
+                value = self.dict[x]
+            else:
+                self.misses += 1
+                value = default
+
+        if self.hit_counter is not None:
+            profiling.count(self.hit_counter if hit else self.miss_counter)
+
+        return value
+
     def __getitem__(self, x):
-        return self.dict[x]
+        missing = object()
+        value = self.get(x, missing)
+        if value is missing:
+            raise KeyError(x)
+        return value
+
     def __setitem__(self, x, y):
-        self.dict[x] = y
-        if len(self.dict) > self.max_count:
-            self.dict.pop(next(iter(self.dict)))
-    
+        size = CacheDict.sizeof(y)
+
+        with self.lock:
+            if x in self.dict:
+                self.__remove(x)
+
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self.dict[x] = y
+            self.sizes[x] = size
+            self.bytes += size
+
+            while (self.max_count is not None and len(self.dict) > self.max_count) or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self.__remove(next(iter(self.dict)))
+                self.evictions += 1
+
+    def __delitem__(self, x):
+        with self.lock:
+            if x not in self.dict:
+                raise KeyError(x)
+            self.__remove(x)
+
+    def __remove(self, x):
+        del self.dict[x]
+        self.bytes -= self.sizes.pop(x)
+
+    def clear(self):
+        with self.lock:
+            self.dict.clear()
+            self.sizes.clear()
+            self.bytes = 0
+
+def disk_cached_array(name : str, key : list, builder):
+    """
+    Returns the array built by builder, stored in parameters.cache_directory so later runs
+        (and other processes) can memory map it instead of building it again.
+
+        name: prefix of the cache file
+        key: list of the values (arrays, numbers, strings) the array depends on
+        builder: function with no arguments that builds the array
+
+    If the cache directory can't be written to the built array is returned without being stored.
+    """
+    digest = hashlib.sha1(f"{name}:{parameters.cache_version}".encode())
+    for value in key:
+        if isinstance(value, np.ndarray):
+            digest.update(str(value.dtype).encode())
+            digest.update(str(value.shape).encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode())
+
+    filename = os.path.join(parameters.cache_directory, f"{name}-v{parameters.cache_version}-{digest.hexdigest()}.npy")
+
+    try:
+        return np.load(filename, mmap_mode = "r")
+    except (OSError, ValueError):
+        pass
+
+    array = builder()
+
+    try:
+        os.makedirs(parameters.cache_directory, exist_ok = True)
+        # write to a temporary file first so other processes never load a partial table
+        handle, temporary = tempfile.mkstemp(suffix = ".npy", dir = parameters.cache_directory)
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.save(file, array)
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, filename)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return np.load(filename, mmap_mode = "r")
+    except OSError:
+        return array
@@ -0,0 +1,149 @@
+
+import struct
+
+import numpy as np
+
+class WavWriter():
+    """
+    Writes a mono wav file block by block.
+        The header is written when the file is opened and the sizes in it are filled in by close.
+
+    Arguments:
+        filename: name of the file to write
+        sample_rate: sample rate of the file in hertz
+
+    Optional Arguments:
+        sample_format: format of the samples in the file, one of WavWriter.sample_formats
+            "int16", "int24": integer pcm (samples in [-1, 1] are scaled to the full range and clipped)
+            "float32", "float64": IEEE float
+            default: "float64"
+        dither: add triangular (TPDF) dither of +-1 least significant bit before rounding to an integer format
+            default: False
+        frames: number of frames that will be written, when it is known the file is created at its full size
+            and the blocks are copied into a memory map of it (writing fewer frames shrinks the file on close)
+            default: None (append every block to the file)
+    """
+
+    # sample format: (wav format tag, bytes per sample, numpy dtype of the samples in the file)
+    sample_formats = {
+        "int16": (1, 2, np.dtype("<i2")),
+        "int24": (1, 3, np.dtype("<i4")),
+        "float32": (3, 4, np.dtype("<f4")),
+        "float64": (3, 8, np.dtype("<f8")),
+    }
+
+    def __init__(self, filename : str, sample_rate : int, sample_format : str = "float64", dither : bool = False, frames : int = None):
+        if sample_format not in WavWriter.sample_formats:
+            raise Exception(f"Invalid sample_format: '{sample_format}'")
+
+        self.format_tag, self.bytes_per_sample, self.dtype = WavWriter.sample_formats[sample_format]
+        self.sample_format = sample_format
+        self.sample_rate = sample_rate
+        self.dither = dither and self.format_tag == 1
+        self.rng = np.random.default_rng() if self.dither else None
+        self.frames = 0
+        self.map = None
+
+        self.file = open(filename, "wb+" if frames is not None else "wb")
+
+        self.__write_header(frames or 0)
+        self.data_offset = self.file.tell()
+
+        if frames is not None:
+            self.file.truncate(self.data_offset + frames * self.bytes_per_sample)
+            if frames:
+                self.map = np.memmap(self.file, dtype=np.uint8, mode="r+", offset=self.data_offset, shape=(frames * self.bytes_per_sample,))
+
+    def __write_header(self, frames : int):
+        data_size = frames * self.bytes_per_sample
+
+        if self.format_tag == 1:
+            # pcm: 16 byte fmt chunk, no fact chunk
+            fmt = struct.pack("<HHIIHH", 1, 1, self.sample_rate, self.sample_rate * self.bytes_per_sample, self.bytes_per_sample, self.bytes_per_sample * 8)
+            fact = b""
+        else:
+            fmt = struct.pack("<HHIIHHH", 3, 1, self.sample_rate, self.sample_rate * self.bytes_per_sample, self.bytes_per_sample, self.bytes_per_sample * 8, 0)
+            fact = b"fact" + struct.pack("<II", 4, frames)
+
+        # chunks have an even size, odd data is followed by a pad byte
+        pad = data_size % 2
+
+        self.file.seek(0)
+        self.file.write(b"RIFF")
+        self.file.write(struct.pack("<I", 4 + 8 + len(fmt) + len(fact) + 8 + data_size + pad))
+        self.file.write(b"WAVE")
+        self.file.write(b"fmt ")
+        self.file.write(struct.pack("<I", len(fmt)))
+        self.file.write(fmt)
+        self.file.write(fact)
+        self.file.write(b"data")
+        self.file.write(struct.pack("<I", data_size))
+
+    def convert(self, samples : np.ndarray):
+        """
+        Returns the bytes of samples in the file's sample format
+        """
+        if self.format_tag == 3:
+            return np.asarray(samples, dtype=self.dtype).tobytes()
+
+        scale = 2 ** (self.bytes_per_sample * 8 - 1) - 1
+
+        samples = np.multiply(samples, scale, dtype=np.float64)
+
+        if self.dither:
+            # the difference of two uniform values has a triangular distribution over +-1 lsb
+            samples += self.rng.random(len(samples))
+            samples -= self.rng.random(len(samples))
+
+        np.rint(samples, out=samples)
+        np.clip(samples, -scale - 1, scale, out=samples)
+
+        integers = samples.astype(self.dtype)
+
+        if self.bytes_per_sample == 3:
+            # the low 3 bytes of every little endian int32
+            return integers.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+        return integers.tobytes()
+
+    def write(self, samples : np.ndarray):
+        """
+        Appends samples to the end of the file
+        """
+        data = self.convert(samples)
+
+        if self.map is not None:
+            start = self.frames * self.bytes_per_sample
+            if start + len(data) > len(self.map):
+                raise Exception(f"More than the {len(self.map) // self.bytes_per_sample} frames the file was created for were written")
+            self.map[start:start + len(data)] = np.frombuffer(data, dtype=np.uint8)
+        else:
+            self.file.write(data)
+
+        self.frames += len(samples)
+
+    def close(self):
+        """
+        Fills in the sizes in the header and closes the file
+        """
+        if self.file.closed:
+            return
+
+        if self.map is not None:
+            self.map.flush()
+            self.map = None
+
+        data_end = self.data_offset + self.frames * self.bytes_per_sample
+        self.file.truncate(data_end)
+        if data_end % 2:
+            self.file.seek(data_end)
+            self.file.write(b"\0")
+
+        self.__write_header(self.frames)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -2,137 +2,316 @@
 import typing
 import math
 import random
+import threading
 
-from .parameters import sample_rate
+import numpy as np
+
+from .parameters import sample_rate, get_sample_rate
 
 from .envelope import Envelope
 
 from .utils import *
 
+from . import profiling
+
+
+def pad_table(table : np.ndarray):
+    """
+    Returns table with one sample from its end added before it and three samples from its start added after it,
+        so the interpolation kernels can read the neighbours of any position in [0, len(table)] without a modulo
+    """
+    table = np.asarray(table, dtype=np.float64)
+    return np.concatenate((table[-1:], table, np.resize(table, 3)))
+
+class InterpolationBuffers():
+    """
+    Work buffers for interpolate so it can run without allocating (eg. in an audio callback)
+
+        size: the largest number of positions that will be interpolated at once
+        mode: interpolation mode the buffers are used for, only its work arrays are allocated
+            (buffers for "cubic" can be used with every mode, default: "cubic")
+    """
+
+    __slots__ = ("index", "fraction", "work")
+
+    # number of work arrays each interpolation mode uses
+    work_arrays = {"nearest": 0, "linear": 1, "cubic": 5}
+
+    def __init__(self, size : int, mode : str = "cubic"):
+        self.index = np.empty(size, dtype=np.int64)
+        self.fraction = np.empty(size, dtype=np.float64)
+        self.work = [np.empty(size, dtype=np.float64) for i in range(InterpolationBuffers.work_arrays[mode])]
+
+def _interpolate_nearest(padded_table : np.ndarray, position : np.ndarray, out : np.ndarray, buffers : InterpolationBuffers):
+    frames = len(position)
+    index = buffers.index[:frames]
+    fraction = buffers.fraction[:frames]
+
+    np.add(position, 0.5, out=fraction)
+    np.floor(fraction, out=fraction)
+    np.copyto(index, fraction, casting="unsafe")
+    np.take(padded_table[1:], index, out=out)
+
+def _interpolate_linear(padded_table : np.ndarray, position : np.ndarray, out : np.ndarray, buffers : InterpolationBuffers):
+    frames = len(position)
+    index = buffers.index[:frames]
+    fraction = buffers.fraction[:frames]
+    upper = buffers.work[0][:frames]
+
+    np.floor(position, out=fraction)
+    np.copyto(index, fraction, casting="unsafe")
+    np.subtract(position, fraction, out=fraction)
+
+    np.take(padded_table[1:], index, out=out)
+    np.take(padded_table[2:], index, out=upper)
+
+    # out + fraction * (upper - out)
+    upper -= out
+    upper *= fraction
+    out += upper
+
+def _interpolate_cubic(padded_table : np.ndarray, position : np.ndarray, out : np.ndarray, buffers : InterpolationBuffers):
+    frames = len(position)
+    index = buffers.index[:frames]
+    fraction = buffers.fraction[:frames]
+    y0, y1, y2, y3, temp = [work[:frames] for work in buffers.work]
+
+    np.floor(position, out=fraction)
+    np.copyto(index, fraction, casting="unsafe")
+    np.subtract(position, fraction, out=fraction)
+
+    np.take(padded_table, index, out=y0)
+    np.take(padded_table[1:], index, out=y1)
+    np.take(padded_table[2:], index, out=y2)
+    np.take(padded_table[3:], index, out=y3)
+
+    # catmull-rom hermite spline: ((c3 * x + c2) * x + c1) * x + y1
+
+    # c3 = (y3 - y0) / 2 + 3 / 2 * (y1 - y2)
+    np.subtract(y3, y0, out=out)
+    out *= 0.5
+    np.subtract(y1, y2, out=temp)
+    temp *= 1.5
+    out += temp
+    out *= fraction
+
+    # c2 = y0 - 5 / 2 * y1 + 2 * y2 - y3 / 2
+    np.multiply(y1, -2.5, out=temp)
+    temp += y0
+    temp += y2
+    temp += y2
+    y3 *= 0.5
+    temp -= y3
+    out += temp
+    out *= fraction
+
+    # c1 = (y2 - y0) / 2
+    np.subtract(y2, y0, out=temp)
+    temp *= 0.5
+    out += temp
+    out *= fraction
+
+    out += y1
+
+interpolation_kernels = {
+    "nearest": _interpolate_nearest,
+    "linear": _interpolate_linear,
+    "cubic": _interpolate_cubic,
+}
+
+def interpolate(padded_table : np.ndarray, position : np.ndarray, mode : str = "linear", out : np.ndarray = None, buffers : InterpolationBuffers = None):
+    """
+    Returns the value of the table at every position
+
+        padded_table: table padded with pad_table
+        position: array of positions in [0, table length)
+        mode: interpolation kernel, one of
+            "nearest": nearest sample (cheapest)
+            "linear": linear interpolation between the two neighbouring samples
+            "cubic": cubic hermite (catmull-rom) interpolation between the four neighbouring samples
+        out: array to write the output to (default: a new array)
+        buffers: InterpolationBuffers to work in (default: new buffers)
+    """
+    if mode not in interpolation_kernels:
+        raise Exception(f"Invalid interpolation mode: '{mode}'")
+
+    if out is None:
+        out = np.empty(len(position), dtype=np.float64)
+    if buffers is None:
+        buffers = InterpolationBuffers(len(position), mode)
+
+    interpolation_kernels[mode](padded_table, position, out, buffers)
+
+    return out
+
 
 class WaveTable():
     """
     General class for storing one period of a wave
+
+    The table is read only, so a WaveTable can be shared by any number of instruments and threads.
+        The position in the table is kept by an Oscillator for every voice playing it (see Oscillator),
+        get_samples, get_samples_bend and get_samples_curve play through the wave table's own shared_oscillator.
     """
-    def __init__(self, function_continuous : typing.Callable[[float] , float], period : float, samples : int = 4096):
+
+    # default interpolation mode used to read the table (see interpolate)
+    interpolation = "linear"
+
+    def __init__(self, function_continuous : typing.Callable[[float] , float], period : float, samples : int = 4096, interpolation : str = "linear"):
         """
         function_continuous: function to be sampled. eg. math.cos
         period: period of the function
         samples: the number of samples to retrieve from the function
+        interpolation: interpolation mode used to read the table ("nearest", "linear" or "cubic")
         """
-        self.wave_table = [function_continuous(x * period / samples) for x in range(samples)]
+        self.interpolation = interpolation
+        x = np.arange(samples, dtype=np.float64) * period / samples
+        try:
+            table = np.array(function_continuous(x), dtype=np.float64)
+        except Exception:
+            table = None
+        if table is None or table.shape != x.shape:
+            # function only accepts scalars (eg. math.cos, or a lambda comparing x)
+            table = np.array([function_continuous(x * period / samples) for x in range(samples)], dtype=np.float64)
+        self.wave_table = table
         self.samples = samples
-        self.last_sample_index = 0
+        self.shared_oscillator = Oscillator(self)
 
-    def __get_sample_interp(self, sample : float):
+    @property
+    def wave_table(self):
+        return self.padded_table[1:-3]
+
+    @wave_table.setter
+    def wave_table(self, table : np.ndarray):
+        self.padded_table = pad_table(table)
+        self.padded_table.setflags(write = False)
+
+    @property
+    def last_sample_index(self):
         """
-        Function used linearly interpolate between samples.
-        returns linear interpolated value of self.wave_table[sample % self.samples]
+        Table index shared_oscillator continues from
         """
+        return self.shared_oscillator.phase
 
-        # print(sample)
-        return (self.wave_table[math.floor(sample) % self.samples] + self.wave_table[math.ceil(sample) % self.samples]) / 2.0
+    @last_sample_index.setter
+    def last_sample_index(self, phase : float):
+        self.shared_oscillator.phase = phase
 
-    def get_samples(self, frequency : float, **kwargs):
+    def get_table(self, frequency : float):
         """
-        Function used for sampling the wave table to get an output at a set frequency.
+        Returns the table to play frequency with
+        """
+        return self.wave_table
 
-        Required arguments:
+    def get_padded_table(self, frequency : float):
+        """
+        Returns the table to play frequency with, padded with pad_table
+        """
+        return self.padded_table
+
+    def __interpolate(self, padded_table : np.ndarray, sample : np.ndarray, interpolation : str):
+        """
+        Function used to interpolate between samples.
+        returns the interpolated value of padded_table at sample % self.samples for every sample in the block
+            (sample is overwritten), using interpolation or self.interpolation
+        """
+        np.remainder(sample, self.samples, out=sample)
+
+        return interpolate(padded_table, sample, interpolation or self.interpolation)
+
+    def render(self, frequency : float, samples : int, start_sample : float = 0.0, interpolation : str = None):
+        """
+        Returns (output, end): samples samples at frequency starting at table index start_sample,
+            and the table index the sample after the output would be at (to continue from).
+            The wave table isn't changed, so it can be called from any number of threads at once.
+
+        Arguments:
             frequency: the frequency in hertz of the output
+            samples: the length in samples of the output
 
-            One length specifier from:
-                samples: the length in samples of the output
-                length: the length in seconds of the output
-                periods: the length in periods at frequency
-        Optional arguments:
-            starting_phase: phase to start the output at in radians
+        Optional Arguments:
+            start_sample: table index of the first sample
                 default: 0
-            random_phase: boolean indicating if a random phase offset should be applied
-                default: False
+            interpolation: interpolation mode ("nearest", "linear" or "cubic")
+                default: self.interpolation
         """
+        padded_table = self.get_padded_table(frequency)
 
-        samples = False
+        with profiling.stage("oscillator", samples):
+            table_step_size = self.samples * (frequency / get_sample_rate())
 
-        if "samples" in kwargs:
-            samples = kwargs["samples"]
-        elif "length" in kwargs:
-            length = kwargs["length"]
-            samples = sample_rate * length
-        elif "periods" in kwargs:
-            periods = kwargs["periods"]
-            samples = periods / frequency / sample_rate
-        else:
-            raise Exception("One of (samples, length, periods) must be specified.")
-        
-        samples = int(samples)
+            sample = start_sample + table_step_size * np.arange(samples, dtype=np.float64)
 
-        start_sample = self.last_sample_index
-        if "starting_phase" in kwargs:
-            starting_phase = kwargs["starting_phase"]
-            start_sample = starting_phase / math.pi * self.samples
-        elif "random_phase" in kwargs:
-            starting_phase = random.random() * math.pi
-            start_sample = starting_phase / math.pi * self.samples
-        
-        table_step_size = self.samples * (frequency / sample_rate)
-        output = list()
-
-        sample = start_sample
-        for i in range(samples):
-            output.append(self.__get_sample_interp(sample))
-            sample += table_step_size
-        self.last_sample_index = sample
-        return output
+            end = (start_sample + table_step_size * samples) % self.samples
 
-    def get_samples_bend(self, frequency1 : float, frequency2 : float, **kwargs):
+            output = self.__interpolate(padded_table, sample, interpolation)
+
+        return output, end
+
+    def render_bend(self, frequency1 : float, frequency2 : float, samples : int, start_sample : float = 0.0, interpolation : str = None):
         """
-        Function used for sampling the wave table to get an output at a set frequency.
+        Returns (output, end) like render for a frequency that changes linearly from frequency1 to frequency2
+        """
+        padded_table = self.get_padded_table(max(frequency1, frequency2))
 
-        Required arguments:
-            frequency1: the frequency in hertz of the beginning of the ouput
-            frequency2: the frequency in hertz of the end of the output
+        with profiling.stage("oscillator", samples):
+            table_step_size = self.samples * (frequency1 / get_sample_rate())
+            table_step_size_step_size = (self.samples * (frequency2 / get_sample_rate()) - table_step_size) / samples if samples else 0.0
 
-            One length specifier from:
-                samples: the length in samples of the output
-                length: the length in seconds of the output
-        Optional arguments:
-            starting_phase: phase to start the output at in radians
-                default: 0
-            random_phase: boolean indicating if a random phase offset should be applied
-                default: False
+            # the step size grows linearly, so the position of sample i is start + i * step + step_step * i * (i - 1) / 2
+            i = np.arange(samples, dtype=np.float64)
+            sample = start_sample + table_step_size * i + table_step_size_step_size * (i * (i - 1) / 2)
+
+            end = (start_sample + table_step_size * samples + table_step_size_step_size * (samples * (samples - 1) / 2)) % self.samples
+
+            output = self.__interpolate(padded_table, sample, interpolation)
+
+        return output, end
+
+    def render_curve(self, frequencies : np.ndarray, start_sample : float = 0.0, interpolation : str = None):
+        """
+        Returns (output, end) like render for a frequency that changes every sample (frequencies has the frequency of every sample)
         """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
 
-        samples = False
+        if not len(frequencies):
+            return np.empty(0, dtype=np.float64), start_sample % self.samples
 
-        if "samples" in kwargs:
-            samples = kwargs["samples"]
-        elif "length" in kwargs:
-            length = kwargs["length"]
-            samples = sample_rate * length
-        else:
-            raise Exception("One of (samples, length, periods) must be specified.")
-        
-        samples = int(samples)
+        padded_table = self.get_padded_table(np.max(frequencies))
 
-        start_sample = self.last_sample_index
-        if "starting_phase" in kwargs:
-            starting_phase = kwargs["starting_phase"]
-            start_sample = starting_phase / math.pi * self.samples
-        elif "random_phase" in kwargs:
-            starting_phase = random.random() * math.pi
-            start_sample = starting_phase / math.pi * self.samples
-        
-        table_step_size = self.samples * (frequency1 / sample_rate)
-        table_step_size_step_size = (self.samples * (frequency2 / sample_rate) - table_step_size) / samples
-        output = list()
-
-        sample = start_sample
-        for i in range(samples):
-            output.append(self.__get_sample_interp(sample))
-            sample += table_step_size
-            table_step_size += table_step_size_step_size
-        self.last_sample_index = sample
-        return output
+        with profiling.stage("oscillator", len(frequencies)):
+            table_step_size = frequencies * (self.samples / get_sample_rate())
+
+            # the position of sample i is start + the sum of the steps before it
+            sample = np.empty(len(frequencies), dtype=np.float64)
+            if len(sample):
+                sample[0] = 0.0
+                np.cumsum(table_step_size[:-1], out=sample[1:])
+            sample += start_sample
+
+            end = (start_sample + np.sum(table_step_size)) % self.samples
+
+            output = self.__interpolate(padded_table, sample, interpolation)
+
+        return output, end
+
+    def get_samples(self, frequency : float, **kwargs):
+        """
+        Plays frequency through shared_oscillator (see Oscillator.get_samples)
+        """
+        return self.shared_oscillator.get_samples(frequency, **kwargs)
+
+    def get_samples_bend(self, frequency1 : float, frequency2 : float, **kwargs):
+        """
+        Plays a bend from frequency1 to frequency2 through shared_oscillator (see Oscillator.get_samples_bend)
+        """
+        return self.shared_oscillator.get_samples_bend(frequency1, frequency2, **kwargs)
+
+    def get_samples_curve(self, frequencies : np.ndarray, **kwargs):
+        """
+        Plays frequencies through shared_oscillator (see Oscillator.get_samples_curve)
+        """
+        return self.shared_oscillator.get_samples_curve(frequencies, **kwargs)
 
 class WaveTableHarmonic(WaveTable):
     """
@@ -146,11 +325,32 @@ class WaveTableHarmonic(WaveTable):
                 default: false
             samples: number of samples to store in the table
                 default: 4096
+            mipmap: precompute a pyramid of band-limited tables so get_padded_table never builds a table
+                "octave": one table per octave
+                "semitone": one table per semitone
+                default: False (tables are built on demand and kept in cached_tables)
+            cache_bytes: memory budget of cached_tables in bytes (the least recently used tables are evicted)
+                default: 8 MiB
+            crossfade: with mipmap, blend the two nearest levels of the pyramid by pitch
+                instead of selecting one (smooths the change in brightness between levels)
+                default: False
+            disk_cache: with mipmap, store the pyramid in parameters.cache_directory and
+                memory map it on later runs
+                default: False
+            interpolation: interpolation mode used to read the table ("nearest", "linear" or "cubic")
+                default: "linear"
     """
 
+    # midi note 0, the bottom of the first level of the pyramid
+    mipmap_base_frequency = 440 * (2 ** (-69 / 12))
+
+    mipmap_steps = {"octave": 12, "semitone": 1}
+
     def __init__(self, amplitudes : typing.List[float], **kargs):
-        
-        self.last_sample_index = 0
+
+        self.shared_oscillator = Oscillator(self)
+
+        self.interpolation = kargs.get("interpolation", "linear")
 
         phases = False
         if "phases" in kargs:
@@ -170,34 +370,184 @@ class WaveTableHarmonic(WaveTable):
         else:
             self.samples = 4096
 
-        self.cached_tables = CacheDict(50)
-        
-        self.harmonic_tables = ZeroList([len(amplitudes),self.samples])
-
-        for amplitude, phase, harmonic, f in zip(amplitudes, phases, self.harmonic_tables, list(range(1,len(amplitudes)+1))):
-            for sample in range(len(harmonic)):
-                harmonic[sample] += amplitude * math.cos(phase + sample / self.samples * math.pi * 2 * f)
-            max_amp = abs(max(harmonic))
-            if max_amp != 0:
-                harmonic = [x / max_amp for x in harmonic]
+        self.cached_tables = CacheDict(max_bytes = kargs.get("cache_bytes", 8 * 1024 * 1024), name = "wave_table.cached_tables")
+
+        if len(amplitudes) >= self.samples // 2:
+            raise Exception("Number of harmonics must be less than half the number of samples")
+
+        self.harmonics = len(amplitudes)
+
+        # spectrum of the full table, harmonic n is stored in bin n
+        self.spectrum = np.zeros(self.samples // 2 + 1, dtype=np.complex128)
+        self.spectrum[1:self.harmonics + 1] = np.asarray(amplitudes, dtype=np.float64) * np.exp(1j * np.asarray(phases, dtype=np.float64)) * (self.samples / 2)
+
+        # wave_table holds every harmonic until set_wave_table picks a table, the outputs pick their own table
+        self.padded_table = self.__build_table(self.harmonics)
+
+        self.mipmap = kargs.get("mipmap", False)
+        self.crossfade = kargs.get("crossfade", False)
+
+        if self.mipmap:
+            if self.mipmap not in WaveTableHarmonic.mipmap_steps:
+                raise Exception(f"Invalid mipmap: '{self.mipmap}'")
+
+            self.mipmap_step = WaveTableHarmonic.mipmap_steps[self.mipmap]
+
+            # the levels are band-limited for this rate, other rates select them by the frequency scaled to it
+            self.mipmap_sample_rate = get_sample_rate()
+
+            # enough levels for the top one to start above the half sample rate
+            levels = math.ceil(12 * math.log2((self.mipmap_sample_rate / 2) / WaveTableHarmonic.mipmap_base_frequency) / self.mipmap_step) + 1
+
+            if kargs.get("disk_cache", False) and "random-phases" not in kargs:
+                self.mipmap_tables = disk_cached_array("mipmap_tables", [self.spectrum, self.samples, self.mipmap_step, levels, self.mipmap_sample_rate], lambda: self.__build_mipmap_tables(levels))
+            else:
+                with profiling.stage("table_build", levels * self.samples):
+                    self.mipmap_tables = self.__build_mipmap_tables(levels)
+                self.mipmap_tables.setflags(write = False)
+
+    def __get_harmonics(self, frequency : float):
+        """
+        Returns the number of harmonics that can be played at frequency without exceeding the half sample rate
+            (the fundamental is always kept below the half sample rate)
+        """
+        harmonics = int(((get_sample_rate() // 2) - frequency) // frequency)
+
+        if frequency < get_sample_rate() / 2:
+            harmonics = max(harmonics, 1)
+
+        return min(harmonics, self.harmonics)
+
+    def __build_table(self, harmonics : int):
+        """
+        Returns a table containing the first harmonics harmonics, padded with pad_table
+        """
+        spectrum = np.zeros_like(self.spectrum)
+        spectrum[:max(harmonics, 0) + 1] = self.spectrum[:max(harmonics, 0) + 1]
+        table = pad_table(np.fft.irfft(spectrum, self.samples))
+        table.setflags(write = False)
+        return table
+
+    def __build_mipmap_tables(self, levels : int):
+        """
+        Returns a (levels x samples + 4) array where level n is band-limited for the highest frequency in the level
+            (each level is padded like pad_table)
+        """
+        spectra = np.tile(self.spectrum, (levels, 1))
+
+        for level in range(levels):
+            top_frequency = WaveTableHarmonic.mipmap_base_frequency * (2 ** ((level + 1) * self.mipmap_step / 12))
+            # the harmonics below the half sample rate at the top of the level, the top level may start below the half
+            # sample rate and end above it so every level keeps the fundamental
+            harmonics = max(int((self.mipmap_sample_rate / 2) // top_frequency), 1)
+            spectra[level, min(harmonics, self.harmonics) + 1:] = 0
+
+        tables = np.fft.irfft(spectra, self.samples, axis = 1)
+
+        return np.concatenate((tables[:, -1:], tables, np.resize(tables.T, (3, levels)).T), axis = 1)
+
+    def get_table(self, frequency : float):
+        """
+        Returns the table for frequency that doesn't include frequencies above the half sample rate
+            (without changing wave_table)
+        """
+        return self.get_padded_table(frequency)[1:-3]
+
+    def get_padded_table(self, frequency : float):
+        """
+        Returns the table for frequency padded with pad_table (see get_table)
+        """
+        if self.mipmap:
+            frequency *= self.mipmap_sample_rate / get_sample_rate()
+            level = 12 * math.log2(max(frequency, WaveTableHarmonic.mipmap_base_frequency) / WaveTableHarmonic.mipmap_base_frequency) / self.mipmap_step
+            index = min(int(level), len(self.mipmap_tables) - 1)
+
+            if self.crossfade and index + 1 < len(self.mipmap_tables):
+                fade = level - index
+                return self.mipmap_tables[index] * (1 - fade) + self.mipmap_tables[index + 1] * fade
+            return self.mipmap_tables[index]
+
+        harmonics = self.__get_harmonics(frequency)
+
+        table = self.cached_tables.get(harmonics)
+
+        if table is not None:
+            return table
+
+        with profiling.stage("table_build", self.samples):
+            table = self.__build_table(harmonics)
+        self.cached_tables[harmonics] = table
+        return table
+
     def set_wave_table(self, frequency : float):
         """
         Sets the wave_table as to not include frequencies above the half sample rate
+            (the outputs don't use wave_table, they read the table for their own frequency)
         """
-        harmonics = int(((sample_rate // 2) - frequency) // frequency)
+        self.padded_table = self.get_padded_table(frequency)
 
-        harmonics = min(harmonics, len(self.harmonic_tables))
 
-        if harmonics in self.cached_tables:
-            self.wave_table = self.cached_tables[harmonics]
-        
+class Oscillator():
+    """
+    Position of one voice in a WaveTable, so many voices (in any number of threads) can play one wave table.
+
+    Arguments:
+        wave_table: the WaveTable to play
+
+    Optional Arguments:
+        phase: table index to start at
+            default: 0
+
+    Every output continues from the table index the last one ended at.
+    """
+
+    __slots__ = ("wave_table", "phase")
+
+    def __init__(self, wave_table : WaveTable, phase : float = 0.0):
+        self.wave_table = wave_table
+        self.phase = phase
+
+    @staticmethod
+    def __get_length(frequency : float, kwargs : dict, allow_periods : bool = True):
+        """
+        Returns the length in samples specified by one of the samples, length or periods kwargs
+        """
+        if "samples" in kwargs:
+            samples = kwargs["samples"]
+        elif "length" in kwargs:
+            length = kwargs["length"]
+            samples = get_sample_rate() * length
+        elif allow_periods and "periods" in kwargs:
+            periods = kwargs["periods"]
+            samples = periods / frequency * get_sample_rate()
         else:
-            new_table = ZeroList([self.samples])
-            
-            for harmonic in range(harmonics):
-                new_table = [x + y for x,y in zip(new_table, self.harmonic_tables[harmonic])]
-            self.wave_table = new_table
-            self.cached_tables[harmonics] = new_table
+            raise Exception("One of (samples, length, periods) must be specified.")
+
+        return int(samples)
+
+    def __get_start_sample(self, kwargs : dict):
+        """
+        Returns the table index to start at from the starting_phase or random_phase kwargs,
+            continuing from the end of the last output by default
+        """
+        start_sample = self.phase
+        if "starting_phase" in kwargs:
+            starting_phase = kwargs["starting_phase"]
+            start_sample = starting_phase / math.pi * self.wave_table.samples
+        elif "random_phase" in kwargs:
+            starting_phase = random.random() * math.pi
+            start_sample = starting_phase / math.pi * self.wave_table.samples
+
+        return start_sample
+
+    @staticmethod
+    def __output(output : np.ndarray, kwargs : dict):
+        """
+        Converts the output to a list when as_list is specified
+        """
+        if kwargs.get("as_list", False):
+            return output.tolist()
+        return output
 
     def get_samples(self, frequency : float, **kwargs):
         """
@@ -212,17 +562,23 @@ class WaveTableHarmonic(WaveTable):
                 periods: the length in periods at frequency
         Optional arguments:
             starting_phase: phase to start the output at in radians
-                default: 0
+                default: where the last output ended
             random_phase: boolean indicating if a random phase offset should be applied
                 default: False
+            as_list: boolean indicating if the output should be returned as a list instead of a numpy array
+                default: False
+            interpolation: interpolation mode ("nearest", "linear" or "cubic")
+                default: the wave table's interpolation
         """
-        self.set_wave_table(frequency)
+        samples = Oscillator.__get_length(frequency, kwargs)
+
+        output, self.phase = self.wave_table.render(frequency, samples, self.__get_start_sample(kwargs), kwargs.get("interpolation"))
+
+        return Oscillator.__output(output, kwargs)
 
-        return super().get_samples(frequency, **kwargs)
-    
     def get_samples_bend(self, frequency1 : float, frequency2 : float, **kwargs):
         """
-        Function used for sampling the wave table to get an output at a set frequency.
+        Function used for sampling the wave table to get an output with a frequency that changes linearly.
 
         Required arguments:
             frequency1: the frequency in hertz of the beginning of the ouput
@@ -232,21 +588,44 @@ class WaveTableHarmonic(WaveTable):
                 samples: the length in samples of the output
                 length: the length in seconds of the output
         Optional arguments:
-            starting_phase: phase to start the output at in radians
-                default: 0
-            random_phase: boolean indicating if a random phase offset should be applied
-                default: False
+            starting_phase, random_phase, as_list, interpolation: see get_samples
         """
+        samples = Oscillator.__get_length(frequency1, kwargs, allow_periods = False)
+
+        output, self.phase = self.wave_table.render_bend(frequency1, frequency2, samples, self.__get_start_sample(kwargs), kwargs.get("interpolation"))
+
+        return Oscillator.__output(output, kwargs)
 
-        self.set_wave_table(max(frequency1,frequency2))
+    def get_samples_curve(self, frequencies : np.ndarray, **kwargs):
+        """
+        Function used for sampling the wave table with a frequency that changes every sample (eg. vibrato).
 
-        return super().get_samples_bend(frequency1, frequency2, **kwargs)
+        Required arguments:
+            frequencies: array with the frequency in hertz of every sample of the output
 
-cos = WaveTable(math.cos, math.pi, sample_rate * 2)
+        Optional arguments:
+            starting_phase, random_phase, as_list, interpolation: see get_samples
+        """
+        output, self.phase = self.wave_table.render_curve(frequencies, self.__get_start_sample(kwargs), kwargs.get("interpolation"))
 
-saw = WaveTableHarmonic([1/n for n in range(1,1025)])
+        return Oscillator.__output(output, kwargs)
 
-ocean_saw = WaveTableHarmonic([1/ (n ** 2) for n in range(1,1025)])
+_lazy_tables = {
+    "cos": lambda: WaveTable(np.cos, math.pi, sample_rate * 2),
+    "saw": lambda: WaveTableHarmonic([1/n for n in range(1,1025)]),
+    "ocean_saw": lambda: WaveTableHarmonic([1/ (n ** 2) for n in range(1,1025)]),
+    "square": lambda: WaveTableHarmonic([(1/n if n % 2 == 1 else 0) for n in range(1,1025)]),
+}
 
-square = WaveTableHarmonic([(1/n if n % 2 == 1 else 0) for n in range(1,1025)])
+_lazy_tables_lock = threading.Lock()
 
+def __getattr__(name : str):
+    """
+    Builds the module level tables (cos, saw, ocean_saw, square) on first access
+    """
+    if name in _lazy_tables:
+        with _lazy_tables_lock:
+            if name not in globals():
+                globals()[name] = _lazy_tables[name]()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")